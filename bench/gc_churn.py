@@ -0,0 +1,98 @@
+#
+# This file is part of looping. Looping is free software available under the
+# terms of the Apache 2.0 license. See the file "LICENSE" that was provided
+# together with this source file for the licensing terms.
+#
+# Copyright (c) 2012-2013 the authors. See the file "AUTHORS" for a complete
+# list.
+
+"""Measure garbage collector activity under handler churn.
+
+Timers, timeouts and readers are created and cancelled in a tight loop, the
+way per-request timeouts are. Handlers that are part of reference cycles
+can only be freed by the cyclic garbage collector, which shows up as
+collected objects and as time spent in collections. Requires Python 3.3+
+for gc.callbacks.
+"""
+
+from __future__ import absolute_import, print_function
+
+import gc
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', 'lib'))
+
+import looping
+
+
+class GCStats(object):
+
+    def __init__(self):
+        self.collections = 0
+        self.collected = 0
+        self.pause = 0.0
+        self.max_pause = 0.0
+        self._start = None
+
+    def __call__(self, phase, info):
+        if phase == 'start':
+            self._start = time.time()
+            return
+        pause = time.time() - self._start
+        self.collections += 1
+        self.collected += info['collected']
+        self.pause += pause
+        self.max_pause = max(self.max_pause, pause)
+
+
+def churn(loop, count):
+    r, w = loop._socketpair()
+    for i in range(count):
+        loop.call_later(10, lambda: None).cancel()
+        timer = loop.call_later(10, lambda: None)
+        timer.reset(5)
+        timer.cancel()
+        loop.call_timeout(10, lambda: None).cancel()
+        loop.add_reader(r.fileno(), lambda: None)
+        loop.remove_reader(r.fileno())
+        if i % 1000 == 0:
+            loop.run_once(0)
+    loop.run()
+    r.close()
+    w.close()
+
+
+def run(name, factory, count):
+    loop = factory()
+    stats = GCStats()
+    gc.collect()
+    gc.callbacks.append(stats)
+    try:
+        t0 = time.time()
+        churn(loop, count)
+        elapsed = time.time() - t0
+    finally:
+        gc.callbacks.remove(stats)
+    loop.close()
+    print('{0:10s} {1:8.3f} s  {2:5d} collections  {3:8d} collected  '
+          '{4:8.3f} ms total pause  {5:8.3f} ms max pause'.format(
+          name, elapsed, stats.collections, stats.collected,
+          stats.pause * 1000, stats.max_pause * 1000))
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    print('Churning {0} timers, timeouts and readers'.format(count))
+    for name in ('pyuv', 'pyside'):
+        try:
+            factory = looping.get_backend(name)
+        except ImportError:
+            continue
+        run(name, factory, count)
+
+
+if __name__ == '__main__':
+    main()
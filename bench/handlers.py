@@ -0,0 +1,60 @@
+#
+# This file is part of looping. Looping is free software available under the
+# terms of the Apache 2.0 license. See the file "LICENSE" that was provided
+# together with this source file for the licensing terms.
+#
+# Copyright (c) 2012-2013 the authors. See the file "AUTHORS" for a complete
+# list.
+
+"""Compare handler recycling against plain allocation.
+
+A number of callback chains each reschedule themselves with call_soon(),
+and every tenth step also with a short call_later(). The loop is run with
+handler_pool_size set to 0 (plain allocation) and to a bounded pool.
+"""
+
+from __future__ import absolute_import, print_function
+
+import gc
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', 'lib'))
+
+import looping
+
+
+def run(name, pool_size, steps, chains=100):
+    looping.PyUVEventLoop.handler_pool_size = pool_size
+    loop = looping.PyUVEventLoop()
+    state = {'steps': 0}
+    def callback():
+        state['steps'] += 1
+        if state['steps'] >= steps:
+            return
+        if state['steps'] % 10 == 0:
+            loop.call_later(0.001, callback)
+        else:
+            loop.call_soon(callback)
+    for i in range(chains):
+        loop.call_soon(callback)
+    gc.collect()
+    t0 = time.time()
+    loop.run()
+    elapsed = time.time() - t0
+    loop.close()
+    print('{0:20s} {1:8.3f} s  {2:10.0f} callbacks/s'.format(
+          name, elapsed, state['steps'] / elapsed))
+
+
+def main():
+    steps = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    print('Running {0} callbacks'.format(steps))
+    run('allocate', 0, steps)
+    run('pool (256)', 256, steps)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+#
+# This file is part of looping. Looping is free software available under the
+# terms of the Apache 2.0 license. See the file "LICENSE" that was provided
+# together with this source file for the licensing terms.
+#
+# Copyright (c) 2012-2013 the authors. See the file "AUTHORS" for a complete
+# list.
+
+"""Measure the time it takes to import looping, with and without backends.
+
+Each measurement runs a fresh interpreter. The baseline is the startup time
+of an interpreter that imports nothing.
+"""
+
+from __future__ import absolute_import, print_function
+
+import os
+import subprocess
+import sys
+import time
+
+libdir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lib')
+
+cases = [
+    ('interpreter startup', 'pass'),
+    ('import looping', 'import looping'),
+    ('import looping + pyuv backend', 'import looping; looping.PyUVEventLoop'),
+    ('import looping + pyside backend', 'import looping; looping.PySideEventLoop'),
+]
+
+
+def measure(code, repeat):
+    env = dict(os.environ)
+    env['PYTHONPATH'] = libdir
+    best = None
+    for i in range(repeat):
+        t0 = time.time()
+        ret = subprocess.call([sys.executable, '-c', code], env=env,
+                              stderr=open(os.devnull, 'w'))
+        elapsed = time.time() - t0
+        if ret != 0:
+            return None
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    baseline = None
+    for name, code in cases:
+        elapsed = measure(code, repeat)
+        if elapsed is None:
+            print('{0:35s} not available'.format(name))
+            continue
+        if baseline is None:
+            baseline = elapsed
+        print('{0:35s} {1:8.1f} ms  (+{2:.1f} ms)'.format(
+              name, elapsed * 1000, (elapsed - baseline) * 1000))
+
+
+if __name__ == '__main__':
+    main()
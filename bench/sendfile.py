@@ -0,0 +1,96 @@
+#
+# This file is part of looping. Looping is free software available under the
+# terms of the Apache 2.0 license. See the file "LICENSE" that was provided
+# together with this source file for the licensing terms.
+#
+# Copyright (c) 2012-2013 the authors. See the file "AUTHORS" for a complete
+# list.
+
+"""Compare sock_sendfile() against copying a file through Python.
+
+A file is sent over a socket pair. A separate thread drains the receiving
+end. The "copy" case reads the file in chunks and writes every chunk from
+an add_writer() callback.
+"""
+
+from __future__ import absolute_import, print_function
+
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', 'lib'))
+
+import looping
+from looping import base
+
+
+def drain(sock):
+    while sock.recv(1024*1024):
+        pass
+    sock.close()
+
+
+def send_copy(loop, sock, f, done):
+    state = {'view': memoryview(b'')}
+    def write_ready():
+        if not state['view']:
+            data = f.read(256*1024)
+            if not data:
+                loop.remove_writer(sock.fileno())
+                done(None, None)
+                return
+            state['view'] = memoryview(data)
+        try:
+            nbytes = sock.send(state['view'])
+        except socket.error:
+            return
+        state['view'] = state['view'][nbytes:]
+    sock.setblocking(False)
+    loop.add_writer(sock.fileno(), write_ready)
+
+
+def send_sendfile(loop, sock, f, done):
+    loop.sock_sendfile(sock, f, 0, None, done)
+
+
+def run(name, method, path):
+    loop = looping.PyUVEventLoop()
+    r, w = loop._socketpair()
+    t = threading.Thread(target=drain, args=(r,))
+    t.start()
+    with open(path, 'rb') as f:
+        t0 = time.time()
+        method(loop, w, f, lambda nbytes, exc: w.close())
+        loop.run()
+        elapsed = time.time() - t0
+    t.join()
+    loop.close()
+    size = os.stat(path).st_size
+    print('{0:20s} {1:8.3f} s  {2:8.1f} MB/s'.format(
+          name, elapsed, size / elapsed / 1024 / 1024))
+
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 256
+    fd, path = tempfile.mkstemp()
+    try:
+        chunk = os.urandom(1024*1024)
+        for i in range(size):
+            os.write(fd, chunk)
+        os.close(fd)
+        print('Sending a {0} MB file'.format(size))
+        run('copy', send_copy, path)
+        run('sendfile', send_sendfile, path)
+        base._Sendfile.use_sendfile = False
+        run('mmap fallback', send_sendfile, path)
+    finally:
+        os.unlink(path)
+
+
+if __name__ == '__main__':
+    main()
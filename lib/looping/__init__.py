@@ -8,14 +8,37 @@
 
 from __future__ import absolute_import, print_function
 
+import sys
+
 from .events import *
+from .futures import *
+from .protocols import *
+from .transports import *
+from .pool import LoopPool
+
+# The event loop classes are imported lazily on first access, because
+# importing a backend can be expensive (e.g. PySide loads the Qt libraries).
+_lazy_loops = {'PyUVEventLoop': 'pyuv', 'PySideEventLoop': 'pyside'}
+
+
+def __getattr__(name):
+    try:
+        backend = _lazy_loops[name]
+    except KeyError:
+        raise AttributeError('module {!r} has no attribute {!r}'
+                             .format(__name__, name))
+    try:
+        cls = get_backend(backend)
+    except ImportError:
+        raise AttributeError('event loop {!r} is not available'.format(name))
+    globals()[name] = cls
+    return cls
 
-try:
-    from .pyuv import PyUVEventLoop
-except ImportError:
-    pass
 
-try:
-    from .pyside import PySideEventLoop
-except ImportError:
-    pass
+if sys.version_info < (3, 7):
+    # Module level __getattr__ requires Python 3.7+ (PEP 562).
+    for _name in _lazy_loops:
+        try:
+            __getattr__(_name)
+        except AttributeError:
+            pass
@@ -0,0 +1,1216 @@
+#
+# This file is part of looping. Looping is free software available under the
+# terms of the Apache 2.0 license. See the file "LICENSE" that was provided
+# together with this source file for the licensing terms.
+#
+# Copyright (c) 2012-2013 the authors. See the file "AUTHORS" for a complete
+# list.
+
+"""Functionality that is shared by the event loop implementations."""
+
+from __future__ import absolute_import, print_function
+
+import collections
+import errno
+import logging
+import mmap
+import os
+import socket
+import signal
+import stat
+import subprocess
+import sys
+import threading
+import weakref
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+from . import events, futures, inbox, inotify, transports, util, winsocketpair
+from .util import get_ident
+
+
+# Since Python 3.5, the signal wakeup fd receives the signal number.
+_wakeup_fd_has_signum = sys.version_info >= (3, 5)
+
+# Events passed to watch_path() callbacks. These are the same as libuv's.
+FS_RENAME = 1
+FS_CHANGE = 2
+
+_inotify_mask = (inotify.IN_MODIFY | inotify.IN_ATTRIB | inotify.IN_CREATE |
+                 inotify.IN_DELETE | inotify.IN_MOVED_FROM |
+                 inotify.IN_MOVED_TO | inotify.IN_DELETE_SELF |
+                 inotify.IN_MOVE_SELF)
+
+
+class Server(object):
+    """A listening socket that creates a transport for each connection.
+
+    Returned by the start_serving_*() methods of the loop. Call close() to
+    stop serving.
+    """
+
+    # Maximum number of connections accepted per readiness event.
+    max_accept = 32
+
+    def __init__(self, loop, sock, protocol_factory, transport_factory,
+                 kwargs=None):
+        self._loop = loop
+        self._sock = sock
+        self._protocol_factory = protocol_factory
+        self._transport_factory = transport_factory
+        self._kwargs = kwargs or {}
+        sock.setblocking(False)
+        loop.add_reader(sock.fileno(), self._accept)
+
+    @property
+    def sockets(self):
+        return [self._sock] if self._sock is not None else []
+
+    def close(self):
+        """Stop serving and close the listening socket."""
+        if self._sock is None:
+            return
+        self._loop.remove_reader(self._sock.fileno())
+        if self._sock.family == getattr(socket, 'AF_UNIX', None):
+            path = self._sock.getsockname()
+            if path:
+                _unlink_socket(path)
+        self._sock.close()
+        self._sock = None
+
+    def _accept(self):
+        for i in range(self.max_accept):
+            try:
+                conn, addr = self._sock.accept()
+            except socket.error as e:
+                if e.errno in util.TRYAGAIN or e.errno == errno.ECONNABORTED:
+                    return
+                logging.error('Error accepting connection: %s', e)
+                return
+            protocol = self._protocol_factory()
+            self._transport_factory(self._loop, conn, protocol,
+                                    extra={'peername': addr}, **self._kwargs)
+
+
+class _Sendfile(object):
+    """State of a sock_sendfile() operation."""
+
+    # Chunk size for the mmap based fallback.
+    chunk_size = 1024*1024
+    use_sendfile = hasattr(os, 'sendfile')
+
+    def __init__(self, loop, sock, fileobj, offset, count, callback):
+        self.loop = loop
+        self.sock = sock
+        self.fd = sock.fileno()
+        self.fileobj = fileobj
+        self.infd = fileobj if isinstance(fileobj, int) else fileobj.fileno()
+        self.offset = offset
+        self.remaining = count
+        self.sent = 0
+        self.callback = callback
+        self.mapping = None
+        self.view = None
+
+    def write_ready(self):
+        while self.remaining > 0:
+            try:
+                if self.use_sendfile:
+                    nbytes = self._sendfile()
+                else:
+                    nbytes = self._send_mapped()
+            except (socket.error, OSError) as e:
+                if e.errno in util.TRYAGAIN:
+                    return
+                if self.use_sendfile and self.sent == 0 and e.errno in \
+                        (errno.EINVAL, errno.ENOSYS, errno.ENOTSOCK,
+                         errno.EOPNOTSUPP):
+                    # E.g. the file is not mmap-able by the kernel.
+                    self.use_sendfile = False
+                    continue
+                self.done(e)
+                return
+            except ValueError as e:
+                # The file cannot be mapped.
+                self.done(e)
+                return
+            if nbytes == 0:
+                break  # The file was truncated.
+            self.offset += nbytes
+            self.sent += nbytes
+            self.remaining -= nbytes
+        self.done(None)
+
+    def _sendfile(self):
+        return os.sendfile(self.fd, self.infd, self.offset, self.remaining)
+
+    def _send_mapped(self):
+        if self.view is None:
+            # The mmap offset must be a multiple of the allocation granularity.
+            start = self.offset - self.offset % mmap.ALLOCATIONGRANULARITY
+            # mmap() fails for a range that extends past the end of file.
+            size = os.fstat(self.infd).st_size
+            length = min(self.chunk_size, self.offset - start + self.remaining,
+                         size - start)
+            if length <= self.offset - start:
+                return 0  # The file was truncated.
+            self.mapping = mmap.mmap(self.infd, length, offset=start,
+                                     access=mmap.ACCESS_READ)
+            self.view = memoryview(self.mapping)[self.offset - start:]
+        nbytes = self.sock.send(self.view)
+        self.view = self.view[nbytes:]
+        if not self.view:
+            self._unmap()
+        return nbytes
+
+    def _unmap(self):
+        if self.view is not None:
+            util.release_memoryview(self.view)
+            self.view = None
+        if self.mapping is not None:
+            self.mapping.close()
+            self.mapping = None
+
+    def done(self, exc):
+        self._unmap()
+        self.loop.remove_writer(self.fd)
+        if self.callback is not None:
+            self.loop.call_soon(self.callback, self.sent, exc)
+        self.callback = None
+
+
+class _ThreadPool(object):
+    """A minimal thread pool that runs blocking functions for a loop.
+
+    The result is passed to ``callback(result, exc)``, which is scheduled on
+    the loop with call_soon_threadsafe().
+    """
+
+    def __init__(self, loop, max_workers):
+        self._loop = loop
+        self._max_workers = max_workers
+        self._queue = queue.Queue()
+        self._threads = []
+        self._idle = 0
+        self._lock = threading.Lock()
+
+    def submit(self, func, args, callback):
+        with self._lock:
+            self._queue.put((func, args, callback))
+            if self._idle <= 0 and len(self._threads) < self._max_workers:
+                thread = threading.Thread(target=self._worker,
+                                          name='looping-executor')
+                thread.daemon = True
+                self._threads.append(thread)
+                thread.start()
+            else:
+                self._idle -= 1
+
+    def shutdown(self):
+        for thread in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def _worker(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            func, args, callback = item
+            try:
+                result = func(*args)
+            except Exception:
+                result, exc = None, sys.exc_info()[1]
+            else:
+                exc = None
+            self._loop.call_soon_threadsafe(callback, result, exc)
+            with self._lock:
+                self._idle += 1
+
+
+class Process(object):
+    """A child process started by spawn_process()."""
+
+    def __init__(self, pid, stdout_cb, stderr_cb, exit_cb):
+        self.pid = pid
+        self.returncode = None
+        self._callbacks = {'stdout': stdout_cb, 'stderr': stderr_cb}
+        self._exit_cb = exit_cb
+        self._open_streams = 0
+        self._exit_status = None
+
+    def send_signal(self, sig):
+        """Send signal *sig* to the process."""
+        if self.returncode is None:
+            os.kill(self.pid, sig)
+
+    def terminate(self):
+        self.send_signal(signal.SIGTERM)
+
+    def kill(self):
+        self.send_signal(signal.SIGKILL)
+
+    def _data_received(self, stream, data):
+        callback = self._callbacks[stream]
+        if callback is not None:
+            callback(data)
+
+    def _stream_closed(self):
+        self._open_streams -= 1
+        self._maybe_exited()
+
+    def _exited(self, exit_status, term_signal):
+        self._exit_status = (exit_status, term_signal)
+        self.returncode = -term_signal if term_signal else exit_status
+        self._maybe_exited()
+
+    def _maybe_exited(self):
+        # The exit callback is called after all output has been delivered.
+        if self._open_streams or self._exit_status is None:
+            return
+        exit_cb, self._exit_cb = self._exit_cb, None
+        if exit_cb is not None:
+            exit_cb(*self._exit_status)
+
+
+class _PopenProcess(Process):
+    """A Process based on subprocess.Popen, with its pipes and its exit
+    registered with a loop using add_reader()."""
+
+    def __init__(self, loop, args, stdout_cb, stderr_cb, exit_cb, cwd, env):
+        devnull = open(os.devnull, 'rb')
+        try:
+            popen = subprocess.Popen(args, stdin=devnull,
+                                     stdout=subprocess.PIPE,
+                                     stderr=subprocess.PIPE if stderr_cb else None,
+                                     cwd=cwd, env=env, close_fds=True)
+        finally:
+            devnull.close()
+        super(_PopenProcess, self).__init__(popen.pid, stdout_cb, stderr_cb,
+                                            exit_cb)
+        self._loop = loop
+        self._popen = popen
+        self._pidfd = None
+        for name in ('stdout', 'stderr'):
+            pipe = getattr(popen, name)
+            if pipe is None:
+                continue
+            util.setblocking(pipe.fileno(), False)
+            loop.add_reader(pipe.fileno(), self._read_pipe, name, pipe)
+            self._open_streams += 1
+        if hasattr(os, 'pidfd_open'):
+            try:
+                self._pidfd = os.pidfd_open(self.pid)
+            except OSError:
+                pass
+        if self._pidfd is not None:
+            loop.add_reader(self._pidfd, self._poll)
+        else:
+            loop._watch_child(self)
+
+    def send_signal(self, sig):
+        if self.returncode is None:
+            self._popen.send_signal(sig)
+
+    def _read_pipe(self, name, pipe):
+        try:
+            data = os.read(pipe.fileno(), 64*1024)
+        except OSError as e:
+            if e.errno in util.TRYAGAIN:
+                return
+            data = b''
+        if data:
+            self._data_received(name, data)
+            return
+        self._loop.remove_reader(pipe.fileno())
+        pipe.close()
+        self._stream_closed()
+
+    def _poll(self):
+        returncode = self._popen.poll()
+        if returncode is None:
+            return False
+        if self._pidfd is not None:
+            self._loop.remove_reader(self._pidfd)
+            os.close(self._pidfd)
+            self._pidfd = None
+        if returncode < 0:
+            self._exited(0, -returncode)
+        else:
+            self._exited(returncode, 0)
+        return True
+
+
+def _read_file(path, offset, size):
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        return f.read() if size is None else f.read(size)
+
+
+def _write_file(path, data, append):
+    with open(path, 'ab' if append else 'wb') as f:
+        f.write(data)
+    return len(data)
+
+
+def _unlink_socket(path):
+    """Remove a stale Unix domain socket."""
+    # An address in the abstract namespace (Linux) starts with a null byte
+    # and has no file. getsockname() returns it as bytes.
+    if path[:1] in ('\0', b'\0'):
+        return
+    try:
+        if stat.S_ISSOCK(os.stat(path).st_mode):
+            os.unlink(path)
+    except OSError:
+        pass
+
+
+class _SignalDispatcher(object):
+    """Dispatches signals to all loops in the process.
+
+    The signal wakeup fd and the signal handlers are process-global, so
+    there is a single dispatcher. It owns the wakeup socketpair, and passes
+    each delivered signal to every loop that has a handler for it. Every
+    such loop reads the socketpair with an internal reader, so that a loop
+    that is blocked in its backend wakes up.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._loops = {}
+        self._socks = None
+        self._old_wakeup_fd = -1
+
+    def fileno(self):
+        """Return the fd to read, or None if no signals are handled."""
+        if self._socks is None:
+            return None
+        return self._socks[0].fileno()
+
+    def add(self, loop, sig):
+        """Deliver *sig* to *loop*.
+
+        Raise RuntimeError if the handler cannot be installed, e.g. because
+        this is not the main thread.
+        """
+        with self._lock:
+            loops = self._loops.get(sig)
+            if loops is None:
+                self._setup()
+                try:
+                    signal.signal(sig, self._handle_signal)
+                except (OSError, RuntimeError, ValueError) as e:
+                    if not self._loops:
+                        self._teardown()
+                    raise RuntimeError(str(e))
+                loops = self._loops[sig] = weakref.WeakValueDictionary()
+            loops[id(loop)] = loop
+
+    def remove(self, loop, sig):
+        """Stop delivering *sig* to *loop*."""
+        with self._lock:
+            loops = self._loops.get(sig)
+            if loops is None:
+                return
+            loops.pop(id(loop), None)
+            if len(loops):
+                return
+            del self._loops[sig]
+            if sig == signal.SIGINT:
+                handler = signal.default_int_handler
+            else:
+                handler = signal.SIG_DFL
+            try:
+                signal.signal(sig, handler)
+            except (OSError, RuntimeError, ValueError) as e:
+                raise RuntimeError(str(e))
+            finally:
+                if not self._loops:
+                    self._teardown()
+
+    def after_fork(self):
+        """Reset the dispatcher in a child process after fork().
+
+        The child inherits the signal handlers and the wakeup socketpair of
+        the parent, but it must not deliver signals to the parent's loops,
+        nor write to a socketpair that the parent reads. Restore the default
+        dispositions and close the inherited socketpair.
+        """
+        with self._lock:
+            signals = list(self._loops)
+            self._loops.clear()
+            for sig in signals:
+                if sig == signal.SIGINT:
+                    handler = signal.default_int_handler
+                else:
+                    handler = signal.SIG_DFL
+                signal.signal(sig, handler)
+            self._teardown()
+
+    def drain(self):
+        """Read the wakeup fd and dispatch the signals in it."""
+        counts = {}
+        with self._lock:
+            while self._socks is not None:
+                try:
+                    data = self._socks[0].recv(4096)
+                except socket.error:
+                    break
+                if not data:
+                    break
+                if _wakeup_fd_has_signum:
+                    for signum in bytearray(data):
+                        counts[signum] = counts.get(signum, 0) + 1
+        self._dispatch(counts)
+
+    def _setup(self):
+        if self._socks is not None:
+            return
+        if hasattr(socket, 'socketpair'):
+            rsock, wsock = socket.socketpair()
+        else:
+            rsock, wsock = winsocketpair.socketpair()
+        rsock.setblocking(False)
+        wsock.setblocking(False)
+        try:
+            try:
+                old = signal.set_wakeup_fd(wsock.fileno(),
+                                           warn_on_full_buffer=False)
+            except TypeError:
+                old = signal.set_wakeup_fd(wsock.fileno())
+        except (ValueError, OSError) as e:
+            rsock.close()
+            wsock.close()
+            raise RuntimeError(str(e))
+        self._old_wakeup_fd = old
+        self._socks = (rsock, wsock)
+
+    def _teardown(self):
+        if self._socks is None:
+            return
+        rsock, wsock = self._socks
+        self._socks = None
+        try:
+            signal.set_wakeup_fd(self._old_wakeup_fd)
+        except (ValueError, OSError):
+            pass
+        rsock.close()
+        wsock.close()
+
+    def _handle_signal(self, signum, frame):
+        # Called by Python in the main thread, after the C level handler
+        # wrote to the wakeup fd. The readers take care of loops that are
+        # blocked in their backend, this takes care of the other loops.
+        # Before Python 3.5 the wakeup fd does not contain the signal
+        # number, so each call counts as a single delivery.
+        self.drain()
+        if not _wakeup_fd_has_signum:
+            self._dispatch({signum: 1})
+
+    def _dispatch(self, counts):
+        with self._lock:
+            targets = [(loop, signum, counts[signum])
+                       for signum in counts
+                       for loop in self._loops.get(signum, {}).values()]
+        for loop, signum, count in targets:
+            loop._signal_received(signum, count)
+
+
+_signal_dispatcher = _SignalDispatcher()
+
+
+class BaseEventLoop(events.AbstractEventLoop):
+    """Base class for the event loops in this package.
+
+    Callbacks submitted from other threads are stored in an :class:`Inbox`.
+    The *inbox_capacity* and *inbox_policy* arguments are passed to it.
+    Subclasses must implement ``_wakeup()``, and empty the inbox with
+    ``self._inbox.swap()`` once per loop iteration.
+
+    A loop is owned by a single thread. This is the thread that created it,
+    and after the loop was started, the thread that runs it. The thread ident
+    of the owner is cached in ``self._owner``, so that subclasses can check
+    for ownership with a single integer compare. Methods that are called from
+    another thread are routed through ``call_soon_threadsafe()``.
+    """
+
+    # Maximum number of threads used for blocking operations, like file
+    # I/O on loops that do not support it natively.
+    max_workers = 4
+
+    # Maximum number of idle callbacks that are run per loop iteration.
+    idle_budget = 16
+
+    # Maximum number of recycled handlers kept per loop. Handlers for
+    # call_soon() and call_later() are recycled after they have run. Set to
+    # 0 to disable recycling.
+    handler_pool_size = 0
+
+    # Resolution of call_timeout(), in seconds.
+    timeout_granularity = 0.1
+
+    def __init__(self, inbox_capacity=None, inbox_policy='block'):
+        super(BaseEventLoop, self).__init__()
+        self._inbox = inbox.Inbox(inbox_capacity, inbox_policy, self._wakeup)
+        self._owner = get_ident()
+        self._handlers = events.HandlerPool(self.handler_pool_size)
+        self._executor = None
+        self._inotify = None
+        self._watches = {}
+        self._children = []
+        self._internal_fds = set()
+        self._signal_handlers = {}
+        self._signal_counts = {}
+        self._signals_pending = collections.deque()
+        self._signals_scheduled = False
+        self._signal_fd = None
+        self._shutting_down = False
+        self._idle = collections.deque()
+        self._timeouts = {}
+        self._timeout_tick = None
+        self._timeout_ticker = None
+
+    def close(self):
+        for sig in list(self._signal_handlers):
+            self.remove_signal_handler(sig)
+        self._idle.clear()
+        self._cancel_timeouts()
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+        if self._inotify is not None:
+            self.remove_reader(self._inotify.fileno())
+            self._inotify.close()
+            self._inotify = None
+            self._watches.clear()
+
+    def run_until(self, deadline):
+        """Run the loop until there is nothing left to do, or until
+        *deadline* has passed. The deadline is a :func:`util.monotonic`
+        timestamp."""
+        self.run(max(0, deadline - util.monotonic()))
+
+    def run_until_complete(self, future, timeout=None):
+        """Run the loop until *future* is done.
+
+        Return the Future's result, or raise its exception. If *timeout* is
+        not None, run for at most that many seconds, and raise TimeoutError
+        if the Future is not done by then. The Future is not cancelled.
+        """
+        def stop(future):
+            self.stop()
+        future.add_done_callback(stop)
+        handler = None
+        if timeout is not None:
+            handler = self.call_later(timeout, self.stop)
+        try:
+            self.run_forever()
+        finally:
+            future.remove_done_callback(stop)
+            if handler is not None:
+                handler.cancel()
+        if not future.done():
+            raise futures.TimeoutError()
+        return future.result()
+
+    def shutdown(self, timeout=None):
+        """Shut down the loop gracefully, and close it.
+
+        From this point on, adding a reader or writer for a file descriptor
+        that is not already registered raises a RuntimeError. The loop runs
+        until all ready callbacks have been run and all writers have been
+        removed, or until *timeout* seconds have passed. Any timers, readers,
+        writers and callbacks that are left are then cancelled in bulk.
+
+        Return a dictionary with the number of ``'callbacks'``, ``'timers'``,
+        ``'readers'`` and ``'writers'`` that were abandoned.
+        """
+        self._set_owner()
+        self._shutting_down = True
+        if timeout is not None:
+            deadline = util.monotonic() + timeout
+        while self._pending_work():
+            if timeout is None:
+                self.run_once()
+                continue
+            remaining = deadline - util.monotonic()
+            if remaining <= 0:
+                break
+            self.run_once(remaining)
+        timeouts = self._cancel_timeouts()
+        abandoned = self._abandon()
+        abandoned['timers'] += timeouts
+        self.close()
+        return abandoned
+
+    def _pending_work(self):
+        """Return whether there are ready callbacks or writers left."""
+        raise NotImplementedError
+
+    def _abandon(self):
+        """Cancel all callbacks, timers, readers and writers that are not
+        for internal use. Return a dictionary with their counts."""
+        raise NotImplementedError
+
+    def _check_registration(self, fd, registered):
+        """Refuse a new file descriptor when the loop is shutting down."""
+        if self._shutting_down and fd not in registered:
+            raise RuntimeError('event loop is shutting down')
+
+    def call_when_idle(self, callback, *args):
+        """Arrange for a callback to be called when the loop is idle.
+
+        The callback is called in a loop iteration in which no other
+        callbacks are ready. At most ``idle_budget`` idle callbacks are
+        called per iteration. This is useful for low priority work that
+        should not compete with I/O.
+
+        Return a Handler that can be used to cancel the callback.
+        """
+        handler = events.make_handler(callback, args)
+        if get_ident() != self._owner:
+            self.call_soon_threadsafe(self.call_when_idle, handler)
+            return handler
+        self._idle.append(handler)
+        if len(self._idle) == 1:
+            self._start_idle()
+        return handler
+
+    def _start_idle(self):
+        """Start calling idle callbacks."""
+        raise NotImplementedError
+
+    def _next_idle_batch(self):
+        """Return the idle callbacks for this iteration."""
+        batch = []
+        while self._idle and len(batch) < self.idle_budget:
+            handler = self._idle.popleft()
+            if not handler.cancelled:
+                batch.append(handler)
+        return batch
+
+    def call_timeout(self, delay, callback, *args):
+        """Arrange for a callback to be called after a coarse timeout.
+
+        This is like ``call_later()``, but optimized for timeouts that are
+        usually cancelled before they expire. Timeouts are kept in buckets of
+        ``timeout_granularity`` seconds, and a single repeating timer expires
+        the buckets that are due. Adding and cancelling a timeout are O(1)
+        and do not create a timer handle. The callback is called at most one
+        granularity late, but never early.
+
+        Return a Handler that can be used to cancel the timeout.
+        """
+        handler = events.make_handler(callback, args)
+        if get_ident() != self._owner:
+            self.call_soon_threadsafe(self.call_timeout, delay, handler)
+            return handler
+        granularity = self.timeout_granularity
+        now = util.monotonic()
+        index = -int(-(now + delay) // granularity)
+        bucket = self._timeouts.get(index)
+        if bucket is None:
+            bucket = self._timeouts[index] = set()
+        bucket.add(handler)
+        # The bucket contains the handler, so the cancel callback references
+        # the loop and the handler weakly to avoid cycles.
+        lref = weakref.ref(self)
+        href = weakref.ref(handler)
+        def cancel():
+            loop, handler = lref(), href()
+            if loop is None or handler is None:
+                return
+            bucket = loop._timeouts.get(index)
+            if bucket is None:
+                return
+            bucket.discard(handler)
+            if not bucket:
+                del loop._timeouts[index]
+        handler.cancel_callback = cancel
+        if self._timeout_ticker is None:
+            self._timeout_tick = int(now // granularity)
+            self._timeout_ticker = self.call_repeatedly(granularity,
+                                                        self._expire_timeouts)
+        return handler
+
+    def _expire_timeouts(self):
+        current = int(util.monotonic() // self.timeout_granularity)
+        while self._timeout_tick <= current:
+            bucket = self._timeouts.pop(self._timeout_tick, None)
+            self._timeout_tick += 1
+            if not bucket:
+                continue
+            for handler in bucket:
+                handler.cancel_callback = None
+                self.call_soon(handler)
+        if not self._timeouts:
+            self._timeout_ticker.cancel()
+            self._timeout_ticker = None
+
+    def _cancel_timeouts(self):
+        """Cancel all timeouts. Return the number cancelled."""
+        count = 0
+        for bucket in self._timeouts.values():
+            for handler in bucket:
+                handler.cancel_callback = None
+                handler.cancel()
+                count += 1
+        self._timeouts.clear()
+        if self._timeout_ticker is not None:
+            self._timeout_ticker.cancel()
+            self._timeout_ticker = None
+        return count
+
+    def resource_report(self):
+        """Return a report of the resources that are held by the loop.
+
+        The report is a dictionary that maps a resource type, e.g.
+        ``'readers'`` or ``'timers'``, to a dictionary with the ``'count'``
+        of resources and their approximate size in ``'bytes'``. The size is
+        the shallow size of the loop's bookkeeping objects and handlers, and
+        does not include memory that is used by the backend itself.
+
+        If handler debugging is enabled with :func:`events.set_debug`, each
+        entry also has ``'sources'``, which maps the call sites that created
+        the handlers to their number.
+        """
+        debug = events.get_debug()
+        report = {}
+        for kind, obj, handler in self._resources():
+            entry = report.get(kind)
+            if entry is None:
+                entry = report[kind] = {'count': 0, 'bytes': 0}
+                if debug:
+                    entry['sources'] = {}
+            entry['count'] += 1
+            entry['bytes'] += sys.getsizeof(obj)
+            if handler is None:
+                continue
+            if handler is not obj:
+                entry['bytes'] += sys.getsizeof(handler)
+            if debug:
+                source = handler.source
+                entry['sources'][source] = entry['sources'].get(source, 0) + 1
+        return report
+
+    def _resources(self):
+        """Yield a ``(kind, object, handler)`` tuple for each resource."""
+        for handler in self._inbox._items:
+            yield 'inbox', handler, handler
+        for handler in self._idle:
+            yield 'idle', handler, handler
+        for bucket in self._timeouts.values():
+            for handler in bucket:
+                yield 'timeouts', handler, handler
+        for handler in self._signal_handlers.values():
+            yield 'signal_handlers', handler, handler
+        for path, handlers in self._watches.values():
+            for handler in handlers:
+                yield 'watches', handler, handler
+        for process in self._children:
+            yield 'processes', process, None
+        for handler in self._handlers._handlers + self._handlers._timers:
+            yield 'handler_pool', handler, None
+
+    def _set_owner(self):
+        """Make the current thread the owner of the loop."""
+        self._owner = get_ident()
+
+    def _wakeup(self):
+        """Wake up the loop from another thread."""
+        raise NotImplementedError
+
+    def _add_internal_reader(self, fd, callback):
+        """Add a reader for internal use. Internal readers do not keep
+        run() from returning."""
+        handler = self.add_reader(fd, callback)
+        self._internal_fds.add(fd)
+        return handler
+
+    def _remove_internal_reader(self, fd):
+        self._internal_fds.discard(fd)
+        return self.remove_reader(fd)
+
+    def _socketpair(self):
+        if hasattr(socket, 'socketpair'):
+            return socket.socketpair()
+        else:
+            return winsocketpair.socketpair()
+
+    def call_soon_threadsafe(self, callback, *args):
+        """Like call_soon(), but thread safe.
+
+        If the inbox is bounded and the policy is ``'drop'``, the callback may
+        be dropped. In that case the returned Handler is cancelled.
+        """
+        handler = events.make_handler(callback, args)
+        if get_ident() == self._owner:
+            return self.call_soon(handler)
+        if not self._inbox.put(handler):
+            handler.cancel()
+        return handler
+
+    def call_batch_threadsafe(self, callbacks):
+        """Schedule a batch of callbacks in one operation. Thread safe.
+
+        The *callbacks* argument is an iterable of Handlers or of
+        ``(callback, args)`` tuples. The batch is queued or dropped as a
+        whole. Returns the list of Handlers.
+        """
+        handlers = [cb if isinstance(cb, events.Handler)
+                    else events.make_handler(cb[0], cb[1]) for cb in callbacks]
+        if get_ident() == self._owner:
+            # Only the owner drains the inbox, so it must not block on it.
+            for handler in handlers:
+                self.call_soon(handler)
+            return handlers
+        if not self._inbox.put_many(handlers):
+            for handler in handlers:
+                handler.cancel()
+        return handlers
+
+    # Unix domain sockets.
+
+    def create_unix_connection(self, protocol_factory, path, **kwargs):
+        """Connect to the Unix domain socket at *path*.
+
+        Returns a ``(transport, protocol)`` tuple. The transport is a
+        :class:`UnixSocketTransport`, and can pass file descriptors. Extra
+        keyword arguments are passed to the transport.
+        """
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(path)
+        except socket.error:
+            sock.close()
+            raise
+        protocol = protocol_factory()
+        transport = transports.UnixSocketTransport(self, sock, protocol,
+                                                   {'peername': path}, **kwargs)
+        return transport, protocol
+
+    def start_serving_unix(self, protocol_factory, path, backlog=100,
+                           **kwargs):
+        """Start serving on the Unix domain socket at *path*.
+
+        A stale socket at *path* is removed first. For every connection, a
+        protocol is created with *protocol_factory* and connected to a
+        :class:`UnixSocketTransport`. Extra keyword arguments are passed to
+        the transport. Returns a :class:`Server`.
+        """
+        _unlink_socket(path)
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.bind(path)
+            sock.listen(backlog)
+        except socket.error:
+            sock.close()
+            raise
+        return Server(self, sock, protocol_factory,
+                      transports.UnixSocketTransport, kwargs)
+
+    # Zero-copy file transmission.
+
+    def sock_sendfile(self, sock, fileobj, offset=0, count=None,
+                      callback=None):
+        """Send *count* bytes of a file, starting at *offset*, over *sock*.
+
+        The file is sent with ``os.sendfile()`` every time the socket becomes
+        writable. Where sendfile is not available, the file is mapped into
+        memory in chunks and sent with ``send()`` from a memoryview.
+
+        The *fileobj* argument is a regular file object or file descriptor.
+        If *count* is None, the file is sent up to its end. When the transfer
+        is complete or has failed, ``callback(nbytes, exc)`` is called with the
+        number of bytes sent and an exception or None.
+
+        Returns a Handler. Cancelling it aborts the transfer without calling
+        the callback.
+        """
+        infd = fileobj if isinstance(fileobj, int) else fileobj.fileno()
+        if count is None:
+            count = max(0, os.fstat(infd).st_size - offset)
+        sock.setblocking(False)
+        op = _Sendfile(self, sock, fileobj, offset, count, callback)
+        handler = events.Handler(op.write_ready, ())
+        self.add_writer(sock.fileno(), handler)
+        return handler
+
+    # Datagram endpoints.
+
+    def create_datagram_endpoint(self, protocol_factory, local_addr=None,
+                                 remote_addr=None, family=socket.AF_INET,
+                                 batch_size=64):
+        """Create a datagram endpoint.
+
+        The socket is bound to *local_addr* if specified, and connected to
+        *remote_addr* if specified. Up to *batch_size* datagrams are read per
+        readiness event, and delivered to the protocol's
+        datagrams_received() in a single call.
+
+        Returns a ``(transport, protocol)`` tuple.
+        """
+        sock = socket.socket(family, socket.SOCK_DGRAM)
+        try:
+            if local_addr is not None:
+                sock.bind(local_addr)
+            if remote_addr is not None:
+                sock.connect(remote_addr)
+        except socket.error:
+            sock.close()
+            raise
+        protocol = protocol_factory()
+        transport = transports.DatagramTransport(self, sock, protocol,
+                                                 batch_size=batch_size)
+        return transport, protocol
+
+    # File I/O. The callbacks are called as callback(result, exc). These
+    # implementations run the blocking calls in a thread pool.
+
+    def _run_blocking(self, func, args, callback):
+        if self._executor is None:
+            self._executor = _ThreadPool(self, self.max_workers)
+        self._executor.submit(func, args, callback)
+
+    def read_file(self, path, callback, offset=0, size=None):
+        """Read *size* bytes from the file at *path*, starting at *offset*.
+
+        If *size* is None, the file is read up to its end. The data is passed
+        to ``callback(data, exc)``.
+        """
+        self._run_blocking(_read_file, (path, offset, size), callback)
+
+    def write_file(self, path, data, callback, append=False):
+        """Write *data* to the file at *path*.
+
+        The file is truncated first, unless *append* is true. The number of
+        bytes written is passed to ``callback(nbytes, exc)``.
+        """
+        self._run_blocking(_write_file, (path, data, append), callback)
+
+    def stat(self, path, callback):
+        """Stat the file at *path*, and pass the result to
+        ``callback(stat_result, exc)``."""
+        self._run_blocking(os.stat, (path,), callback)
+
+    # File change watching.
+
+    def watch_path(self, path, callback):
+        """Watch the file or directory at *path* for changes.
+
+        The changes that are detected during a loop iteration are passed to
+        the callback in a single call, as a list of ``(filename, events)``
+        tuples, where *events* is a bit mask of `FS_RENAME` and `FS_CHANGE`.
+        Multiple events for the same file are merged.
+
+        Returns a Handler. Cancel it to stop watching.
+
+        This implementation uses inotify, and is only available on Linux.
+        """
+        if self._inotify is None:
+            self._inotify = inotify.Inotify()
+            self.add_reader(self._inotify.fileno(), self._read_inotify)
+        wd = self._inotify.add_watch(path, _inotify_mask)
+        handler = events.Handler(callback, ())
+        self._watches.setdefault(wd, (path, []))[1].append(handler)
+        # The watch table contains the handler, so the cancel callback
+        # references the loop and the handler weakly to avoid cycles.
+        lref = weakref.ref(self)
+        href = weakref.ref(handler)
+        def cancel():
+            loop, handler = lref(), href()
+            if loop is None or handler is None:
+                return
+            loop._unwatch(wd, handler)
+        handler.cancel_callback = cancel
+        return handler
+
+    def _unwatch(self, wd, handler):
+        if wd not in self._watches:
+            return
+        path, handlers = self._watches[wd]
+        if handler in handlers:
+            handlers.remove(handler)
+        if not handlers:
+            # The kernel acknowledges this with an IN_IGNORED event for a wd
+            # that is no longer in the table, which is skipped.
+            self._inotify.rm_watch(wd)
+            del self._watches[wd]
+        self._check_inotify()
+
+    def _check_inotify(self):
+        if not self._watches and self._inotify is not None:
+            # Do not keep the loop alive when nothing is watched.
+            self.remove_reader(self._inotify.fileno())
+            self._inotify.close()
+            self._inotify = None
+
+    def _read_inotify(self):
+        changes = collections.OrderedDict()
+        removed = {}
+        for wd, mask, cookie, name in self._inotify.read_events():
+            if wd not in self._watches:
+                continue
+            if mask & inotify.IN_IGNORED:
+                # The kernel removed the watch, e.g. because the path was
+                # deleted. The wd is gone, so it must not be passed to
+                # rm_watch() anymore. Changes that were read before it are
+                # still delivered.
+                removed[wd] = self._watches.pop(wd)
+                continue
+            path, handlers = self._watches[wd]
+            flags = FS_CHANGE if mask & (inotify.IN_MODIFY|inotify.IN_ATTRIB) \
+                        else FS_RENAME
+            key = (wd, name or os.path.basename(path))
+            changes[key] = changes.get(key, 0) | flags
+        batches = {}
+        for (wd, name), flags in changes.items():
+            batches.setdefault(wd, []).append((name, flags))
+        for wd, batch in batches.items():
+            # A callback may have cancelled the watch in the meantime.
+            entry = self._watches.get(wd) or removed.get(wd)
+            if entry is None:
+                continue
+            path, handlers = entry
+            for handler in list(handlers):
+                if handler.cancelled:
+                    continue
+                try:
+                    handler.callback(list(batch))
+                except Exception:
+                    logging.exception('Exception in callback %s',
+                                      handler.callback)
+        self._check_inotify()
+
+    # Child processes.
+
+    def spawn_process(self, args, stdout_cb=None, exit_cb=None, stderr_cb=None,
+                      cwd=None, env=None):
+        """Start a child process.
+
+        The *args* argument is the program and its arguments. Output of the
+        child is read from non-blocking pipes, and passed to
+        ``stdout_cb(data)`` and ``stderr_cb(data)``. If *stderr_cb* is None,
+        the child inherits the standard error of this process. Standard input
+        is connected to the null device.
+
+        When the child has exited and all its output has been delivered,
+        ``exit_cb(exit_status, term_signal)`` is called.
+
+        Returns a :class:`Process`.
+
+        This implementation detects the exit of the child with a pidfd where
+        available (Linux 5.3+, Python 3.9+), and with a SIGCHLD handler
+        otherwise.
+        """
+        return _PopenProcess(self, args, stdout_cb, stderr_cb, exit_cb, cwd,
+                             env)
+
+    def _watch_child(self, process):
+        if not self._children:
+            self.add_signal_handler(signal.SIGCHLD, self._reap_children)
+        self._children.append(process)
+        # The child may have exited before the handler was installed.
+        self.call_soon(self._reap_children)
+
+    def _reap_children(self):
+        self._children = [child for child in self._children
+                          if not child._poll()]
+        if not self._children:
+            self.remove_signal_handler(signal.SIGCHLD)
+
+    # Signal handling.
+    #
+    # Signals are delivered by the process-wide _signal_dispatcher, which
+    # reads a single wakeup fd. Signals that are delivered multiple times
+    # before the loop gets to run result in a single callback.
+    # signal_delivery_count() returns the number of deliveries that were
+    # coalesced.
+
+    def add_signal_handler(self, sig, callback, *args):
+        """Add a handler for a signal. Unix only.
+
+        Raise ValueError if the signal number is invalid or uncatchable.
+        Raise RuntimeError if there is a problem setting up the handler.
+        """
+        self._validate_signal(sig)
+        handler = events.make_handler(callback, args)
+        _signal_dispatcher.add(self, sig)
+        self._signal_handlers[sig] = handler
+        if self._signal_fd is None:
+            self._signal_fd = _signal_dispatcher.fileno()
+            self._add_internal_reader(self._signal_fd,
+                                      _signal_dispatcher.drain)
+        return handler
+
+    def remove_signal_handler(self, sig):
+        """Remove a handler for a signal. Unix only.
+
+        Return True if a signal handler was removed, False if not.
+        """
+        self._validate_signal(sig)
+        try:
+            del self._signal_handlers[sig]
+        except KeyError:
+            return False
+        self._signal_counts.pop(sig, None)
+        # The reader goes first, the dispatcher closes the fd when no loop
+        # handles a signal anymore.
+        if not self._signal_handlers and self._signal_fd is not None:
+            self._remove_internal_reader(self._signal_fd)
+            self._signal_fd = None
+        _signal_dispatcher.remove(self, sig)
+        return True
+
+    def signal_delivery_count(self, sig):
+        """Return the number of times *sig* was delivered since the previous
+        call of its handler. Call this from the signal handler."""
+        return self._signal_counts.get(sig, 0)
+
+    def _signal_received(self, signum, count):
+        # Called from any thread. call_soon() is thread-safe in all loops.
+        self._signals_pending.append((signum, count))
+        if not self._signals_scheduled:
+            self._signals_scheduled = True
+            self.call_soon(self._process_signals)
+
+    def _process_signals(self):
+        # Reset the flag first, so that a signal that is received while
+        # this runs schedules another call.
+        self._signals_scheduled = False
+        counts = {}
+        while self._signals_pending:
+            signum, count = self._signals_pending.popleft()
+            counts[signum] = counts.get(signum, 0) + count
+        for signum in sorted(counts):
+            handler = self._signal_handlers.get(signum)
+            if handler is None:
+                continue
+            if handler.cancelled:
+                self.remove_signal_handler(signum)
+                continue
+            self._signal_counts[signum] = counts[signum]
+            try:
+                handler.callback(*handler.args)
+            except Exception:
+                logging.exception('Exception in signal handler %s %r',
+                                  handler.callback, handler.args)
+
+    def _validate_signal(self, sig):
+        """Internal helper to validate a signal.
+
+        Raise ValueError if the signal number is invalid or uncatchable.
+        Raise RuntimeError if there is a problem setting up the handler.
+        """
+        if not isinstance(sig, int):
+            raise TypeError('sig must be an int, not {!r}'.format(sig))
+        if not (1 <= sig < signal.NSIG):
+            raise ValueError('sig {} out of range(1, {})'.format(sig, signal.NSIG))
+        if sys.platform == 'win32':
+            raise RuntimeError('Signals are not really supported on Windows')
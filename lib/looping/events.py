@@ -19,22 +19,59 @@ from __future__ import absolute_import, print_function
 
 __all__ = ['EventLoopPolicy', 'DefaultEventLoopPolicy',
            'AbstractEventLoop', 'Timer', 'Handler', 'make_handler',
+           'make_timer', 'HandlerPool',
            'get_event_loop_policy', 'set_event_loop_policy',
            'get_event_loop', 'set_event_loop', 'new_event_loop',
+           'get_backend', 'set_debug', 'get_debug',
            ]
 
+import os
 import sys
 import threading
+import traceback
+
+from . import util
+
+
+_debug = False
+_package_dir = os.path.dirname(os.path.abspath(__file__))
+
+
+def set_debug(enabled):
+    """Enable or disable handler debugging.
+
+    When enabled, each Handler records the call site that created it. This
+    is shown by :attr:`Handler.source` and used by ``resource_report()``.
+    It is expensive, so it should only be used to track down leaks.
+    """
+    global _debug
+    _debug = bool(enabled)
+
+
+def get_debug():
+    return _debug
+
+
+def _extract_stack():
+    if not _debug:
+        return None
+    return traceback.extract_stack(sys._getframe(2), 16)
 
 
 class Handler(object):
     """Object returned by callback registration methods."""
 
+    __slots__ = ('_callback', '_args', '_cancelled', '_cancel_callback',
+                 '_generation', '_pooled', '_stack', '__weakref__')
+
     def __init__(self, callback, args, cancel_callback=None):
         self._callback = callback
         self._args = args
         self._cancelled = False
         self._cancel_callback = cancel_callback
+        self._generation = 0
+        self._pooled = False
+        self._stack = _extract_stack()
 
     def __del__(self):
         self.cancel()
@@ -57,6 +94,21 @@ class Handler(object):
     def cancelled(self):
         return self._cancelled
 
+    @property
+    def source(self):
+        """The call site that created this handler, as a string, or None if
+        handler debugging was not enabled."""
+        if self._stack is None:
+            return None
+        for filename, lineno, name, line in reversed(self._stack):
+            if os.path.dirname(os.path.abspath(filename)) != _package_dir:
+                return '{}:{} ({})'.format(filename, lineno, name)
+
+    @property
+    def generation(self):
+        """The number of times this handler was recycled by a pool."""
+        return self._generation
+
     def cancel(self):
         if self._cancel_callback:
             self._cancel_callback()
@@ -71,6 +123,15 @@ class Handler(object):
 
     cancel_callback = property(_get_cancel_callback, _set_cancel_callback)
 
+    def _recycle(self):
+        self._callback = None
+        self._args = None
+        self._cancelled = False
+        self._cancel_callback = None
+        self._pooled = False
+        self._stack = None
+        self._generation += 1
+
 
 def make_handler(callback, args):
     if isinstance(callback, Handler):
@@ -80,12 +141,21 @@ def make_handler(callback, args):
 
 
 class Timer(Handler):
-    """Object returned by timed callback registration methods."""
+    """Object returned by timed callback registration methods.
 
-    def __init__(self, when, callback, args):
+    A timer that supports rescheduling has a *reset_callback*. It is called
+    by :meth:`reset` with the new delay, and should restart the underlying
+    timer in place.
+    """
+
+    __slots__ = ('_when', '_delay', '_reset_callback')
+
+    def __init__(self, when, callback, args, delay=None):
         super(Timer, self).__init__(callback, args)
         assert when is not None
         self._when = when
+        self._delay = delay
+        self._reset_callback = None
 
     def __repr__(self):
         res = 'Timer({}, {}, {})'.format(self._when,
@@ -99,33 +169,149 @@ class Timer(Handler):
     def when(self):
         return self._when
 
+    def reset(self, delay=None):
+        """Reschedule the timer to expire *delay* seconds from now.
+
+        If *delay* is None, the timer's original delay is used. Raise a
+        RuntimeError if the timer was cancelled, has expired, or does not
+        support rescheduling.
+        """
+        if self._cancelled or self._reset_callback is None:
+            raise RuntimeError('timer cannot be reset')
+        if delay is None:
+            delay = self._delay
+        self._when = util.monotonic() + delay
+        self._reset_callback(delay)
+
+    def extend(self, delta):
+        """Push back the expiration of the timer by *delta* seconds."""
+        self.reset(self._when + delta - util.monotonic())
+
+    def _get_reset_callback(self):
+        return self._reset_callback
+
+    def _set_reset_callback(self, reset_callback):
+        self._reset_callback = reset_callback
+
+    reset_callback = property(_get_reset_callback, _set_reset_callback)
+
+    def _recycle(self):
+        super(Timer, self)._recycle()
+        self._reset_callback = None
+
+    # Timers are ordered by their expiration time. Equality is identity,
+    # because a timer can be rescheduled, and so that timers are hashable.
+
     def __lt__(self, other):
         return self._when < other._when
 
     def __le__(self, other):
-        if self._when < other._when:
-            return True
-        return self.__eq__(other)
+        return self._when <= other._when
 
     def __gt__(self, other):
         return self._when > other._when
 
     def __ge__(self, other):
-        if self._when > other._when:
-            return True
-        return self.__eq__(other)
+        return self._when >= other._when
+
+
+def make_timer(delay, callback, args):
+    if isinstance(callback, Handler):
+        assert not args
+        return callback
+    return Timer(util.monotonic() + delay, callback, args, delay)
 
-    def __eq__(self, other):
-        if isinstance(other, Timer):
-            return (self._when == other._when and
-                    self._callback == other._callback and
-                    self._args == other._args and
-                    self._cancelled == other._cancelled)
-        return NotImplemented
 
-    def __ne__(self, other):
-        equal = self.__eq__(other)
-        return NotImplemented if equal is NotImplemented else not equal
+def _getrefcount(obj):
+    return sys.getrefcount(obj)
+
+def _refs_in_call():
+    obj = object()
+    return _getrefcount(obj)
+
+# The reference count of an object that is held in a single local variable
+# by a caller, as seen from inside the function it is passed to.
+_REFS_IN_CALL = _refs_in_call() if hasattr(sys, 'getrefcount') else None
+
+
+class HandlerPool(object):
+    """A bounded freelist of :class:`Handler` and :class:`Timer` objects.
+
+    Handlers for one-shot callbacks are taken from the pool, and returned to
+    it by the loop after their callback has run. A handler is only recycled
+    if the loop holds the last reference to it, so a handler that a caller
+    kept is never reused under it. Each time a handler is recycled its
+    generation is incremented.
+
+    A pool with a *maxsize* of 0 just allocates new handlers. Pooling is
+    also disabled on Python implementations without ``sys.getrefcount()``.
+    """
+
+    def __init__(self, maxsize=0):
+        if _REFS_IN_CALL is None:
+            maxsize = 0
+        self._maxsize = maxsize
+        self._handlers = []
+        self._timers = []
+
+    @property
+    def maxsize(self):
+        return self._maxsize
+
+    def __len__(self):
+        return len(self._handlers) + len(self._timers)
+
+    def handler(self, callback, args):
+        """Return a Handler for *callback* and *args*."""
+        if isinstance(callback, Handler):
+            assert not args
+            return callback
+        if self._handlers:
+            handler = self._handlers.pop()
+            handler._callback = callback
+            handler._args = args
+            handler._stack = _extract_stack()
+        else:
+            handler = Handler(callback, args)
+        handler._pooled = self._maxsize > 0
+        return handler
+
+    def timer(self, delay, callback, args):
+        """Return a Timer that expires *delay* seconds from now.
+
+        If *callback* is a Handler, it is returned as is. Only a Timer
+        supports rescheduling.
+        """
+        if isinstance(callback, Handler):
+            assert not args
+            return callback
+        when = util.monotonic() + delay
+        if self._timers:
+            timer = self._timers.pop()
+            timer._callback = callback
+            timer._args = args
+            timer._when = when
+            timer._delay = delay
+            timer._stack = _extract_stack()
+        else:
+            timer = Timer(when, callback, args, delay)
+        timer._pooled = self._maxsize > 0
+        return timer
+
+    def release(self, handler):
+        """Return *handler* to the pool.
+
+        The caller must hold *handler* in a single local variable. Return
+        True if the handler was recycled.
+        """
+        if not handler._pooled or sys.getrefcount(handler) > _REFS_IN_CALL:
+            return False
+        freelist = self._timers if isinstance(handler, Timer) else self._handlers
+        if len(freelist) >= self._maxsize:
+            return False
+        handler._recycle()
+        freelist.append(handler)
+        return True
 
 
 class AbstractEventLoop(object):
@@ -133,8 +319,16 @@ class AbstractEventLoop(object):
 
     # TODO: Rename run() -> run_until_idle(), run_forever() -> run().
 
-    def run(self):
-        """Run the event loop.  Block until there is nothing left to do."""
+    def run(self, timeout=None):
+        """Run the event loop.  Block until there is nothing left to do.
+
+        If timeout is not None, return after at most that many seconds.
+        """
+        raise NotImplementedError
+
+    def run_until(self, deadline):  # NEW!
+        """Run the event loop until there is nothing left to do, or
+        until the util.monotonic() time *deadline* has passed."""
         raise NotImplementedError
 
     def run_forever(self):
@@ -156,6 +350,27 @@ class AbstractEventLoop(object):
         """
         raise NotImplementedError
 
+    def step(self):  # NEW!
+        """Process the events and callbacks that are ready, without
+        blocking. This is used to embed the loop in another loop."""
+        raise NotImplementedError
+
+    def backend_fd(self):  # NEW!
+        """Return a file descriptor that becomes readable when the loop
+        has events to process, or raise NotImplementedError.
+
+        Readers and timers that were added since the last call to step()
+        may only be reflected in the fd after the next call. In that case
+        backend_timeout() returns 0.
+        """
+        raise NotImplementedError
+
+    def backend_timeout(self):  # NEW!
+        """Return the number of seconds after which step() should be
+        called even if the backend fd is not readable, or None if only the
+        fd can wake up the loop."""
+        raise NotImplementedError
+
     def stop(self):  # NEW!
         """Stop the event loop as soon as reasonable.
 
@@ -164,6 +379,15 @@ class AbstractEventLoop(object):
         """
         raise NotImplementedError
 
+    def shutdown(self, timeout=None):  # NEW!
+        """Shut down the event loop gracefully, and close it.
+
+        Pending callbacks and writes are allowed to complete for at most
+        *timeout* seconds. Return a dictionary with the number of callbacks,
+        timers, readers and writers that were abandoned.
+        """
+        raise NotImplementedError
+
     # Methods returning Handlers for scheduling callbacks.
 
     def call_later(self, delay, callback, *args):
@@ -242,6 +466,29 @@ class AbstractEventLoop(object):
         raise NotImplementedError
 
 
+# Event loop backends: name -> (module, class name). Backends are imported
+# lazily, so that e.g. importing looping does not pull in Qt when only the
+# pyuv backend is used.
+_backends = {
+    'pyuv': ('looping.pyuv', 'PyUVEventLoop'),
+    'pyside': ('looping.pyside', 'PySideEventLoop'),
+}
+
+
+def get_backend(name):
+    """Return the event loop class for the backend *name*.
+
+    The backend module is imported on first use. Raise ImportError if the
+    backend is not available.
+    """
+    try:
+        modname, clsname = _backends[name]
+    except KeyError:
+        raise ValueError('unknown backend: {!r}'.format(name))
+    module = __import__(modname, fromlist=[clsname])
+    return getattr(module, clsname)
+
+
 class EventLoopPolicy(object):
     """Abstract policy for accessing the event loop."""
 
@@ -269,9 +516,24 @@ class DefaultEventLoopPolicy(threading.local, EventLoopPolicy):
     event loop, or automatically creating an event loop per thread, or
     using some other notion of context to which an event loop is
     associated).
+
+    The *backend* argument selects the event loop implementation that is
+    used by new_event_loop(). It is a backend name, or a sequence of names
+    that are tried in order. It defaults to `default_backends`.
     """
 
     _event_loop = None
+    default_backends = ('pyuv',)
+
+    def __init__(self, backend=None):
+        if backend is None:
+            backend = self.default_backends
+        elif isinstance(backend, str):
+            backend = (backend,)
+        for name in backend:
+            if name not in _backends:
+                raise ValueError('unknown backend: {!r}'.format(name))
+        self._backends = tuple(backend)
 
     def get_event_loop(self):
         """Get the event loop.
@@ -294,9 +556,12 @@ class DefaultEventLoopPolicy(threading.local, EventLoopPolicy):
         You must call set_event_loop() to make this the current event
         loop.
         """
-        import looping
-        if hasattr(looping, 'PyUVEventLoop'):
-            return looping.PyUVEventLoop()
+        for name in self._backends:
+            try:
+                cls = get_backend(name)
+            except ImportError:
+                continue
+            return cls()
 
 
 # Event loop policy.  The policy itself is always global, even if the
@@ -0,0 +1,147 @@
+#
+# This file is part of looping. Looping is free software available under the
+# terms of the Apache 2.0 license. See the file "LICENSE" that was provided
+# together with this source file for the licensing terms.
+#
+# Copyright (c) 2012-2013 the authors. See the file "AUTHORS" for a complete
+# list.
+
+"""A minimal Future that is bound to an event loop.
+
+Unlike ``tulip.Future``, this Future does not support ``yield from``. It is
+a container for the result of an asynchronous operation, with callbacks that
+are called through the loop's ``call_soon()`` when it is done. It works on
+Python 2 and 3.
+"""
+
+from __future__ import absolute_import, print_function
+
+__all__ = ['CancelledError', 'InvalidStateError', 'TimeoutError', 'Future']
+
+from . import events
+
+
+class CancelledError(Exception):
+    """The Future was cancelled."""
+
+
+class InvalidStateError(Exception):
+    """The operation is not allowed in the current state of the Future."""
+
+
+class TimeoutError(Exception):
+    """The operation did not complete in time."""
+
+
+_PENDING = 'PENDING'
+_CANCELLED = 'CANCELLED'
+_FINISHED = 'FINISHED'
+
+
+class Future(object):
+    """The result of an asynchronous operation.
+
+    The callbacks added with :meth:`add_done_callback` are scheduled with
+    *loop*, which defaults to the current event loop, and are called with the
+    Future as their only argument.
+    """
+
+    __slots__ = ('_loop', '_state', '_result', '_exception', '_callbacks',
+                 '__weakref__')
+
+    def __init__(self, loop=None):
+        if loop is None:
+            loop = events.get_event_loop()
+        self._loop = loop
+        self._state = _PENDING
+        self._result = None
+        self._exception = None
+        self._callbacks = []
+
+    def __repr__(self):
+        res = 'Future<{}'.format(self._state)
+        if self._state == _FINISHED:
+            if self._exception is not None:
+                res += ', exception={!r}'.format(self._exception)
+            else:
+                res += ', result={!r}'.format(self._result)
+        return res + '>'
+
+    def cancel(self):
+        """Cancel the Future.
+
+        Return True if the Future was cancelled, or False if it was done
+        already.
+        """
+        if self._state != _PENDING:
+            return False
+        self._state = _CANCELLED
+        self._schedule_callbacks()
+        return True
+
+    def cancelled(self):
+        return self._state == _CANCELLED
+
+    def done(self):
+        return self._state != _PENDING
+
+    def result(self):
+        """Return the result of the Future.
+
+        Raise the exception if the Future has one, CancelledError if it was
+        cancelled, and InvalidStateError if it is not done yet.
+        """
+        if self._state == _CANCELLED:
+            raise CancelledError()
+        if self._state != _FINISHED:
+            raise InvalidStateError('result is not ready')
+        if self._exception is not None:
+            raise self._exception
+        return self._result
+
+    def exception(self):
+        """Return the exception of the Future, or None if it has a result."""
+        if self._state == _CANCELLED:
+            raise CancelledError()
+        if self._state != _FINISHED:
+            raise InvalidStateError('exception is not set')
+        return self._exception
+
+    def add_done_callback(self, fn):
+        """Add a callback to be called when the Future is done.
+
+        If the Future is done already, the callback is scheduled right away.
+        """
+        if self._state != _PENDING:
+            self._loop.call_soon(fn, self)
+        else:
+            self._callbacks.append(fn)
+
+    def remove_done_callback(self, fn):
+        """Remove a callback. Return the number of callbacks removed."""
+        callbacks = [cb for cb in self._callbacks if cb != fn]
+        removed = len(self._callbacks) - len(callbacks)
+        if removed:
+            self._callbacks[:] = callbacks
+        return removed
+
+    def set_result(self, result):
+        if self._state != _PENDING:
+            raise InvalidStateError('{}: {!r}'.format(self._state, self))
+        self._result = result
+        self._state = _FINISHED
+        self._schedule_callbacks()
+
+    def set_exception(self, exception):
+        if self._state != _PENDING:
+            raise InvalidStateError('{}: {!r}'.format(self._state, self))
+        if isinstance(exception, type):
+            exception = exception()
+        self._exception = exception
+        self._state = _FINISHED
+        self._schedule_callbacks()
+
+    def _schedule_callbacks(self):
+        callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            self._loop.call_soon(callback, self)
@@ -0,0 +1,123 @@
+#
+# This file is part of looping. Looping is free software available under the
+# terms of the Apache 2.0 license. See the file "LICENSE" that was provided
+# together with this source file for the licensing terms.
+#
+# Copyright (c) 2012-2013 the authors. See the file "AUTHORS" for a complete
+# list.
+
+"""A multi-producer, single-consumer inbox.
+
+The inbox is used by the event loops to receive callbacks from other threads.
+Producers append items under a lock. The consumer, which is the loop thread,
+takes out all items at once with ``swap()``, which is a single operation per
+loop iteration regardless of the number of items.
+"""
+
+from __future__ import absolute_import, print_function
+
+__all__ = ['Inbox']
+
+import threading
+
+from . import util
+
+
+class Inbox(object):
+    """A bounded multi-producer, single-consumer queue.
+
+    The *capacity* argument is the maximum number of items that a single
+    producer thread may have in the inbox at any time. If it is None, the
+    inbox is unbounded.
+
+    The *policy* argument specifies what happens when a producer exceeds its
+    capacity. With ``'block'``, the producer blocks until the consumer has
+    emptied the inbox. With ``'drop'``, the items are not added.
+
+    The *wakeup* argument is a callable that is called without arguments
+    when the inbox becomes non-empty. It is used to wake up the consumer.
+    """
+
+    policies = ('block', 'drop')
+
+    def __init__(self, capacity=None, policy='block', wakeup=None):
+        if capacity is not None and capacity < 1:
+            raise ValueError('invalid capacity: {}'.format(capacity))
+        if policy not in self.policies:
+            raise ValueError('invalid policy: {!r}'.format(policy))
+        self._capacity = capacity
+        self._policy = policy
+        self._wakeup = wakeup
+        self._items = []
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._swapped = threading.Condition(self._lock)
+        self._waiters = 0
+
+    def __len__(self):
+        return len(self._items)
+
+    @property
+    def capacity(self):
+        return self._capacity
+
+    @property
+    def policy(self):
+        return self._policy
+
+    def put(self, item, timeout=None):
+        """Add an item to the inbox.
+
+        Return True if the item was added, or False if it was dropped.
+        """
+        return self.put_many((item,), timeout)
+
+    def put_many(self, items, timeout=None):
+        """Add a batch of items to the inbox.
+
+        The batch is added atomically, and is either added or dropped as a
+        whole. With the ``'block'`` policy, *timeout* is the maximum number of
+        seconds to wait for room in the inbox, after which the batch is
+        dropped.
+
+        Return True if the items were added, or False if they were dropped.
+        """
+        items = list(items)
+        if not items:
+            return True
+        with self._lock:
+            if self._capacity is not None:
+                ident = util.get_ident()
+                if len(items) > self._capacity:
+                    return False
+                while self._pending.get(ident, 0) + len(items) > self._capacity:
+                    if self._policy == 'drop':
+                        return False
+                    self._waiters += 1
+                    try:
+                        self._swapped.wait(timeout)
+                    finally:
+                        self._waiters -= 1
+                    if timeout is not None and \
+                            self._pending.get(ident, 0) + len(items) > self._capacity:
+                        return False
+                self._pending[ident] = self._pending.get(ident, 0) + len(items)
+            was_empty = not self._items
+            self._items.extend(items)
+        if was_empty and self._wakeup is not None:
+            self._wakeup()
+        return True
+
+    def swap(self):
+        """Remove and return all items in the inbox.
+
+        This must only be called from the consumer thread.
+        """
+        if not self._items:
+            return []
+        with self._lock:
+            items, self._items = self._items, []
+            self._pending.clear()
+            if self._waiters:
+                self._swapped.notify_all()
+        return items
@@ -0,0 +1,107 @@
+#
+# This file is part of looping. Looping is free software available under the
+# terms of the Apache 2.0 license. See the file "LICENSE" that was provided
+# together with this source file for the licensing terms.
+#
+# Copyright (c) 2012-2013 the authors. See the file "AUTHORS" for a complete
+# list.
+
+"""A minimal ctypes wrapper for the Linux inotify API.
+
+The inotify file descriptor is non-blocking and can be registered with an
+event loop using ``add_reader()``. Availability: Linux.
+"""
+
+from __future__ import absolute_import, print_function
+
+import ctypes
+import ctypes.util
+import errno
+import os
+import struct
+import sys
+
+IN_ACCESS = 0x00000001
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_IGNORED = 0x00008000
+
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+
+_event = struct.Struct('iIII')
+
+_libc = None
+
+
+def _get_libc():
+    global _libc
+    if _libc is None:
+        if not sys.platform.startswith('linux'):
+            raise RuntimeError('inotify is only available on Linux')
+        _libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6',
+                            use_errno=True)
+    return _libc
+
+
+def _check(result):
+    if result < 0:
+        err = ctypes.get_errno()
+        raise OSError(err, os.strerror(err))
+    return result
+
+
+class Inotify(object):
+    """An inotify instance."""
+
+    def __init__(self):
+        self._libc = _get_libc()
+        self._fd = _check(self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC))
+
+    def fileno(self):
+        return self._fd
+
+    def close(self):
+        if self._fd != -1:
+            os.close(self._fd)
+            self._fd = -1
+
+    def add_watch(self, path, mask):
+        """Watch *path* for the events in *mask*. Return a watch descriptor."""
+        if not isinstance(path, bytes):
+            path = path.encode(sys.getfilesystemencoding())
+        return _check(self._libc.inotify_add_watch(self._fd, path, mask))
+
+    def rm_watch(self, wd):
+        """Remove the watch with descriptor *wd*."""
+        _check(self._libc.inotify_rm_watch(self._fd, wd))
+
+    def read_events(self):
+        """Read the pending events.
+
+        Return a list of ``(wd, mask, cookie, name)`` tuples. The name is
+        empty for events on the watched path itself.
+        """
+        try:
+            data = os.read(self._fd, 64*1024)
+        except OSError as e:
+            if e.errno == errno.EAGAIN:
+                return []
+            raise
+        result = []
+        pos = 0
+        while pos + _event.size <= len(data):
+            wd, mask, cookie, size = _event.unpack_from(data, pos)
+            pos += _event.size
+            name = data[pos:pos+size].rstrip(b'\0')
+            pos += size
+            result.append((wd, mask, cookie,
+                           name.decode(sys.getfilesystemencoding())))
+        return result
@@ -0,0 +1,205 @@
+#
+# This file is part of looping. Looping is free software available under the
+# terms of the Apache 2.0 license. See the file "LICENSE" that was provided
+# together with this source file for the licensing terms.
+#
+# Copyright (c) 2012-2013 the authors. See the file "AUTHORS" for a complete
+# list.
+
+"""A pool of event loops, one per thread.
+
+This allows an I/O bound service to use more than one core. Work is handed
+to the loops either as callbacks via ``submit()``, or as connected sockets via
+``add_socket()``.
+"""
+
+from __future__ import absolute_import, print_function
+
+__all__ = ['LoopPool']
+
+import logging
+import threading
+
+from . import events
+
+
+def _default_loop_factory():
+    """Create a new PyUVEventLoop on its own pyuv.Loop."""
+    import pyuv
+    from .pyuv import PyUVEventLoop
+    return PyUVEventLoop(pyuv.Loop())
+
+
+def _cpu_count():
+    try:
+        import multiprocessing
+        return multiprocessing.cpu_count()
+    except (ImportError, NotImplementedError):
+        return 1
+
+
+class _Worker(object):
+    """A single loop in a pool, and the thread that runs it."""
+
+    def __init__(self, index):
+        self.index = index
+        self.loop = None
+        self.thread = None
+        self.started = threading.Event()
+        self.submitted = 0
+        self.completed = 0
+        self.sockets = []
+
+    @property
+    def pending(self):
+        return self.submitted - self.completed
+
+    @property
+    def load(self):
+        # Prune sockets that have been closed in the meantime.
+        self.sockets = [sock for sock in self.sockets if sock.fileno() != -1]
+        return self.pending + len(self.sockets)
+
+    def run(self, handler):
+        try:
+            if not handler.cancelled:
+                handler.callback(*handler.args)
+        finally:
+            self.completed += 1
+
+    def stats(self):
+        return {'submitted': self.submitted,
+                'completed': self.completed,
+                'pending': self.pending,
+                'sockets': len(self.sockets)}
+
+
+class LoopPool(object):
+    """A pool of event loops, each one running in its own thread.
+
+    The *size* argument specifies the number of loops, and defaults to the
+    number of CPUs. The *loop_factory* argument is a callable that creates a
+    new event loop. It is called in the thread that will run the loop. The
+    default factory creates a :class:`PyUVEventLoop` on a new ``pyuv.Loop``.
+
+    The *balance* argument specifies how work is distributed over the loops.
+    It can be ``'round-robin'`` or ``'least-loaded'``. The load of a loop is
+    the number of submitted callbacks that have not yet completed, plus the
+    number of sockets that were handed to it and that are still open.
+    """
+
+    balance_policies = ('round-robin', 'least-loaded')
+
+    def __init__(self, size=None, loop_factory=None, balance='round-robin'):
+        if size is None:
+            size = _cpu_count()
+        if size < 1:
+            raise ValueError('invalid pool size: {}'.format(size))
+        if balance not in self.balance_policies:
+            raise ValueError('invalid balance policy: {!r}'.format(balance))
+        self._size = size
+        self._loop_factory = loop_factory or _default_loop_factory
+        self._balance = balance
+        self._workers = []
+        self._next = 0
+        self._lock = threading.Lock()
+
+    @property
+    def size(self):
+        return self._size
+
+    @property
+    def loops(self):
+        """The event loops in this pool."""
+        return [worker.loop for worker in self._workers]
+
+    def start(self):
+        """Start the loops in the pool."""
+        if self._workers:
+            raise RuntimeError('pool already started')
+        for i in range(self._size):
+            worker = _Worker(i)
+            worker.thread = threading.Thread(target=self._run_worker,
+                                             args=(worker,),
+                                             name='LoopPool-{}'.format(i))
+            worker.thread.daemon = True
+            self._workers.append(worker)
+            worker.thread.start()
+        for worker in self._workers:
+            worker.started.wait()
+            if worker.loop is None:
+                self.stop()
+                raise RuntimeError('could not create event loop')
+
+    def stop(self, timeout=None):
+        """Stop all loops in the pool and wait for their threads to exit."""
+        for worker in self._workers:
+            if worker.loop is not None:
+                worker.loop.call_soon_threadsafe(worker.loop.stop)
+        for worker in self._workers:
+            worker.thread.join(timeout)
+        self._workers = []
+
+    def _run_worker(self, worker):
+        try:
+            loop = self._loop_factory()
+        except Exception:
+            logging.exception('Could not create event loop')
+            worker.started.set()
+            return
+        events.set_event_loop(loop)
+        worker.loop = loop
+        worker.started.set()
+        try:
+            loop.run_forever()
+        finally:
+            events.set_event_loop(None)
+            loop.close()
+
+    def _select_worker(self):
+        if not self._workers:
+            raise RuntimeError('pool not started')
+        if self._balance == 'round-robin':
+            worker = self._workers[self._next]
+            self._next = (self._next + 1) % len(self._workers)
+        else:
+            worker = min(self._workers, key=lambda w: w.load)
+        return worker
+
+    def submit(self, callback, *args):
+        """Run a callback in one of the loops in the pool.
+
+        Returns a Handler that can be used to cancel the callback.
+        """
+        handler = events.make_handler(callback, args)
+        with self._lock:
+            worker = self._select_worker()
+            worker.submitted += 1
+        worker.loop.call_soon_threadsafe(worker.run, handler)
+        return handler
+
+    def add_socket(self, sock, callback, *args):
+        """Hand a connected socket to one of the loops in the pool.
+
+        The callback is called as ``callback(loop, sock, *args)`` in the
+        thread of the loop that was selected. The socket counts towards the
+        load of that loop until it is closed.
+
+        Returns a Handler that can be used to cancel the callback.
+        """
+        with self._lock:
+            worker = self._select_worker()
+            worker.submitted += 1
+            worker.sockets.append(sock)
+        handler = events.Handler(callback, (worker.loop, sock) + args)
+        worker.loop.call_soon_threadsafe(worker.run, handler)
+        return handler
+
+    def stats(self):
+        """Return aggregate statistics for the loops in the pool."""
+        with self._lock:
+            per_loop = [worker.stats() for worker in self._workers]
+        totals = {'loops': len(per_loop), 'per_loop': per_loop}
+        for key in ('submitted', 'completed', 'pending', 'sockets'):
+            totals[key] = sum(stats[key] for stats in per_loop)
+        return totals
@@ -0,0 +1,69 @@
+#
+# This file is part of looping. Looping is free software available under the
+# terms of the Apache 2.0 license. See the file "LICENSE" that was provided
+# together with this source file for the licensing terms.
+#
+# Copyright (c) 2012-2013 the authors. See the file "AUTHORS" for a complete
+# list.
+
+"""Abstract protocol classes.
+
+A protocol is the object that receives notifications from a transport. The
+methods below are all optional, and do nothing by default.
+"""
+
+from __future__ import absolute_import, print_function
+
+__all__ = ['BaseProtocol', 'Protocol', 'DatagramProtocol']
+
+
+class BaseProtocol(object):
+    """Base class for all protocols."""
+
+    def connection_made(self, transport):
+        """Called when a connection is made."""
+
+    def connection_lost(self, exc):
+        """Called when the connection is lost or closed.
+
+        The argument is an exception object or None. None means the
+        connection was closed normally.
+        """
+
+    def pause_writing(self):
+        """Called when the transport's write buffer goes over the high
+        water mark."""
+
+    def resume_writing(self):
+        """Called when the transport's write buffer drains below the low
+        water mark."""
+
+
+class Protocol(BaseProtocol):
+    """Protocol for stream transports."""
+
+    def data_received(self, data):
+        """Called when some data is received."""
+
+    def eof_received(self):
+        """Called when the other end called write_eof() or equivalent."""
+
+
+class DatagramProtocol(BaseProtocol):
+    """Protocol for datagram transports."""
+
+    def datagrams_received(self, datagrams):
+        """Called with a list of ``(data, addr)`` tuples.
+
+        Transports deliver the datagrams that were received in one loop
+        iteration with a single call. The default implementation calls
+        datagram_received() for each of them.
+        """
+        for data, addr in datagrams:
+            self.datagram_received(data, addr)
+
+    def datagram_received(self, data, addr):
+        """Called when a datagram is received."""
+
+    def error_received(self, exc):
+        """Called when a send or receive operation fails."""
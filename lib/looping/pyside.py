@@ -9,16 +9,15 @@
 from __future__ import absolute_import, print_function
 
 import sys
-import socket
+import math
 import logging
 import weakref
-import select
 import collections
 
 from PySide.QtCore import (QObject, QSocketNotifier, QTimer,
-        QCoreApplication, QEvent, QEventLoop, QThread,
-        QAbstractEventDispatcher)
-from . import events
+        QCoreApplication, QEvent, QEventLoop, QAbstractEventDispatcher)
+from . import base, events, util
+from .util import get_ident
 
 
 class RunCallbacks(QEvent):
@@ -34,10 +33,20 @@ class EventProcessor(QObject):
     def __init__(self, qapp, loop):
         super(EventProcessor, self).__init__(parent=qapp)
         self._qapp = qapp
-        self._loop = loop  # a reference to ensure the loop is kept alive
+        # The processor is owned by the QApplication, and would keep the
+        # loop alive forever if it referenced it strongly.
+        self._loop = weakref.ref(loop)
         self._queue = collections.deque()
-        dispatcher = QAbstractEventDispatcher.instance()
-        dispatcher.awake.connect(self.run)
+        self._dispatcher = QAbstractEventDispatcher.instance()
+        self._dispatcher.awake.connect(self.run)
+
+    def close(self):
+        if self._dispatcher is None:
+            return
+        self._dispatcher.awake.disconnect(self.run)
+        self._dispatcher = None
+        self._queue.clear()
+        self.setParent(None)
 
     def event(self, event):
         if event.type() == RunCallbacks.EventType:
@@ -47,20 +56,38 @@ class EventProcessor(QObject):
             return False
 
     def run(self):
+        loop = self._loop()
+        if loop is None:
+            return
+        self._queue.extend(loop._inbox.swap())
         ntodo = len(self._queue)
         for i in range(ntodo):
             handler = self._queue.popleft()
-            if handler.cancelled:
-                continue
-            try:
-                handler.callback(*handler.args)
-            except Exception as e:
-                logging.exception('Exception in callback %s %r',
-                                  handler.callback, handler.args)
+            if not handler.cancelled:
+                try:
+                    handler.callback(*handler.args)
+                except Exception as e:
+                    logging.exception('Exception in callback %s %r',
+                                      handler.callback, handler.args)
+            loop._handlers.release(handler)
 
     @property
     def pending(self):
-        return len(self._queue) > 0
+        loop = self._loop()
+        return len(self._queue) > 0 or (loop is not None and len(loop._inbox) > 0)
+
+    def cancel_all(self):
+        """Cancel all pending callbacks. Return the number cancelled."""
+        loop = self._loop()
+        if loop is not None:
+            self._queue.extend(loop._inbox.swap())
+        count = 0
+        for handler in self._queue:
+            if not handler.cancelled:
+                handler.cancel()
+                count += 1
+        self._queue.clear()
+        return count
 
     def submit(self, handler):
         self._queue.append(handler)
@@ -70,11 +97,61 @@ class EventProcessor(QObject):
         self._qapp.postEvent(self, event)
 
 
-class PySideEventLoop(events.AbstractEventLoop):
+class PyUVBridge(QObject):
+    """Run a :class:`PyUVEventLoop` from within the Qt event loop.
+
+    The backend fd of the pyuv loop is watched with a QSocketNotifier, and
+    its next timeout with a single-shot QTimer that is re-armed each time
+    the Qt dispatcher is about to block. When either fires, the pyuv loop is
+    stepped once. No thread or polling is required.
+    """
+
+    def __init__(self, loop, parent=None):
+        super(PyUVBridge, self).__init__(parent)
+        self._loop = loop
+        self._notifier = QSocketNotifier(loop.backend_fd(),
+                                         QSocketNotifier.Read, self)
+        self._notifier.activated.connect(self._step)
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.timeout.connect(self._step)
+        self._dispatcher = QAbstractEventDispatcher.instance()
+        self._dispatcher.aboutToBlock.connect(self._update_timer)
+        self._update_timer()
+
+    @property
+    def loop(self):
+        return self._loop
+
+    def close(self):
+        if self._dispatcher is None:
+            return
+        self._dispatcher.aboutToBlock.disconnect(self._update_timer)
+        self._dispatcher = None
+        self._notifier.setEnabled(False)
+        self._timer.stop()
+
+    def _step(self, *args):
+        try:
+            self._loop.step()
+        except Exception:
+            logging.exception('Exception while stepping %r', self._loop)
+
+    def _update_timer(self):
+        timeout = self._loop.backend_timeout()
+        if timeout is None:
+            self._timer.stop()
+        else:
+            # Round up so that the timer does not fire before the pyuv
+            # timer is due, which would cause a spurious step.
+            self._timer.start(int(math.ceil(1000 * timeout)))
+
+
+class PySideEventLoop(base.BaseEventLoop):
     """A PEP3156 style EventLoop for Qt4 using PySide."""
 
-    def __init__(self):
-        super(PySideEventLoop, self).__init__()
+    def __init__(self, inbox_capacity=None, inbox_policy='block'):
+        super(PySideEventLoop, self).__init__(inbox_capacity, inbox_policy)
         qapp = QCoreApplication.instance()
         if qapp is None:
             qapp = QCoreApplication(sys.argv)
@@ -84,23 +161,54 @@ class PySideEventLoop(events.AbstractEventLoop):
         self._readers = {}
         self._writers = {}
         self._processor = EventProcessor(qapp, self)
+        self._bridges = []
+        self._idle_timer = QTimer()
+        self._idle_timer.setInterval(0)
+        self._idle_timer.timeout.connect(self._process_idle)
+        # Wakes up processEvents() when the timeout passed to run() expires.
+        self._run_timer = QTimer()
+        self._run_timer.setSingleShot(True)
 
     # Run methods
 
     def run_once(self, timeout=None):
+        self._set_owner()
         events = QEventLoop.AllEvents | QEventLoop.WaitForMoreEvents
         if timeout is None:
             self._qapp.processEvents(events)
         else:
             self._qapp.processEvents(events, timeout * 1000)
 
-    def run(self):
-        """Run until there are no more events.
-        This only looks at events scheduled through the event loop.
+    def step(self):
+        # Qt does not expose a pollable file descriptor, so there is no
+        # backend_fd(). Embedding code has to call this periodically.
+        self._set_owner()
+        self._qapp.processEvents(QEventLoop.AllEvents)
+        if self._processor.pending:
+            self._processor.run()
+
+    def run(self, timeout=None):
+        """Run until there are no more events, or until *timeout* seconds
+        have passed. This only looks at events scheduled through the event
+        loop.
         """
+        self._set_owner()
         self._stop = False
+        deadline = None
+        if timeout is not None:
+            deadline = util.monotonic() + timeout
+            self._run_timer.start(1000 * timeout)
+        try:
+            self._run(deadline)
+        finally:
+            self._run_timer.stop()
+
+    def _run(self, deadline):
         while not self._stop:
-            have_sources = self._timers or self._readers or self._writers
+            if deadline is not None and util.monotonic() >= deadline:
+                break
+            have_sources = (self._timers or self._writers or self._idle or
+                            len(self._readers) > len(self._internal_fds))
             if not self._processor.pending and not have_sources:
                 break
             events = QEventLoop.AllEvents
@@ -112,6 +220,7 @@ class PySideEventLoop(events.AbstractEventLoop):
 
     def run_forever(self):
         """Run the loop until stop() is called."""
+        self._set_owner()
         handler = self.call_repeatedly(24*3600, lambda: None)
         try:
             self.run()
@@ -122,6 +231,11 @@ class PySideEventLoop(events.AbstractEventLoop):
         self._stop = True
 
     def close(self):
+        for bridge in self._bridges:
+            bridge.close()
+        del self._bridges[:]
+        self._idle_timer.stop()
+        self._run_timer.stop()
         for timer in self._timers:
             timer.stop()
         self._timers.clear()
@@ -131,18 +245,74 @@ class PySideEventLoop(events.AbstractEventLoop):
         for qsn in self._writers.values():
             qsn.setEnabled(False)
         self._writers.clear()
+        super(PySideEventLoop, self).close()
+        self._processor.close()
 
-    def _check_thread(self):
-        if QThread.currentThread() != self._processor.thread():
-            err = 'Method must be called from thread owning the loop.'
-            raise RuntimeError(err)
+    def attach_pyuv_loop(self, loop):
+        """Run the :class:`PyUVEventLoop` *loop* from within this loop.
+
+        The pyuv loop is stepped whenever it has work, so code written for
+        either loop can share a thread. Use run_forever() to run both loops.
+        Return a :class:`PyUVBridge`, which can be closed to detach.
+        """
+        bridge = PyUVBridge(loop, self._processor)
+        self._bridges.append(bridge)
+        return bridge
+
+    def _resources(self):
+        for resource in super(PySideEventLoop, self)._resources():
+            yield resource
+        for qsn in self._readers.values():
+            yield 'readers', qsn, qsn.handler
+        for qsn in self._writers.values():
+            yield 'writers', qsn, qsn.handler
+        for timer in self._timers:
+            yield 'timers', timer, timer.handler
+        for handler in self._processor._queue:
+            yield 'ready', handler, handler
+        for bridge in self._bridges:
+            yield 'bridges', bridge, None
+
+    def _pending_work(self):
+        return self._processor.pending or bool(self._writers)
+
+    def _abandon(self):
+        idle = [handler for handler in self._idle if not handler.cancelled]
+        for handler in idle:
+            handler.cancel()
+        self._idle.clear()
+        abandoned = {'callbacks': self._processor.cancel_all() + len(idle),
+                     'timers': len(self._timers),
+                     'readers': len(set(self._readers) - self._internal_fds),
+                     'writers': len(self._writers)}
+        for timer in self._timers:
+            timer.stop()
+        self._timers.clear()
+        for fd in list(self._readers):
+            if fd not in self._internal_fds:
+                self._readers.pop(fd).setEnabled(False)
+        for qsn in self._writers.values():
+            qsn.setEnabled(False)
+        self._writers.clear()
+        return abandoned
+
+    def _start_idle(self):
+        self._idle_timer.start()
+
+    def _process_idle(self):
+        # A timer with a zero interval times out when Qt has processed all
+        # pending window system events.
+        if self._processor.pending:
+            return
+        for handler in self._next_idle_batch():
+            self._processor.submit(handler)
+        if not self._idle:
+            self._idle_timer.stop()
+        self._processor.wakeup()
+
+    def _wakeup(self):
+        self._processor.wakeup()
 
-    def _socketpair(self):
-        if hasattr(socket, 'socketpair'):
-            return socket.socketpair()
-        else:
-            return winsocketpair.socketpair()
- 
     # Timers..
 
     def _create_timer(self, interval, single_shot, handler):
@@ -150,47 +320,62 @@ class PySideEventLoop(events.AbstractEventLoop):
         timer.setInterval(1000 * interval)
         timer.setSingleShot(single_shot)
         self._timers.add(timer)
+        timer.handler = handler
+        # The loop owns the timer, and the timer owns the handler. The
+        # callbacks only reference the loop and the timer weakly, so that
+        # there are no reference cycles.
+        lref = weakref.ref(self)
         wref = weakref.ref(timer)
         def callback():
-            timer = wref()
-            if single_shot and timer:
+            loop, timer = lref(), wref()
+            if loop is None or timer is None:
+                return
+            if single_shot:
                 timer.stop()
-                self._timers.discard(timer)
-            self._processor.submit(handler)
+                loop._timers.discard(timer)
+                if isinstance(handler, events.Timer):
+                    handler.reset_callback = None
+            loop._processor.submit(handler)
         timer.timeout.connect(callback)
         def cancel():
-            timer = wref()
+            loop, timer = lref(), wref()
             if timer:
                 timer.stop()
-                self._timers.discard(timer)
+            if loop and timer:
+                loop._timers.discard(timer)
         handler.cancel_callback = cancel
+        if single_shot and isinstance(handler, events.Timer):
+            def reset(delay):
+                timer = wref()
+                if timer:
+                    timer.start(max(0, 1000 * delay))
+            handler.reset_callback = reset
         timer.start()
         return timer
 
     def call_later(self, when, callback, *args):
-        self._check_thread()
-        handler = events.make_handler(callback, args)
+        handler = events.make_timer(when, callback, args)
+        if get_ident() != self._owner:
+            self.call_soon_threadsafe(self.call_later, when, handler)
+            return handler
         self._create_timer(when, True, handler)
         return handler
 
     def call_repeatedly(self, interval, callback, *args):
-        self._check_thread()
         handler = events.make_handler(callback, args)
+        if get_ident() != self._owner:
+            self.call_soon_threadsafe(self.call_repeatedly, interval, handler)
+            return handler
         self._create_timer(interval, False, handler)
         return handler
 
     def call_soon(self, callback, *args):
-        self._check_thread()
-        handler = events.make_handler(callback, args)
+        if get_ident() != self._owner:
+            return self.call_soon_threadsafe(callback, *args)
+        handler = self._handlers.handler(callback, args)
         self._processor.submit(handler)
         return handler
 
-    def call_soon_threadsafe(self, callback, *args):
-        handler = events.make_handler(callback, args)
-        self._processor.submit(handler)
-        self._processor.wakeup()
-        return handler
-
     # File descriptor operations
 
     def _create_qsn(self, fd, events, handler):
@@ -202,32 +387,54 @@ class PySideEventLoop(events.AbstractEventLoop):
         if qsn is not None:
             qsn.setEnabled(False)
         qsn = QSocketNotifier(fd, events)
+        qsn.handler = handler
         notifiers[fd] = qsn
-        qsn.activated.connect(lambda: self._processor.submit(handler))
+        # See _create_timer() for the ownership of the notifier and handler.
+        lref = weakref.ref(self)
         wref = weakref.ref(qsn)
+        def activated():
+            loop = lref()
+            if loop is not None:
+                loop._processor.submit(handler)
+        qsn.activated.connect(activated)
         def cancel():
-            qsn = wref()
+            loop, qsn = lref(), wref()
             if qsn:
                 qsn.setEnabled(False)
+            if loop is None:
+                return
+            if events == QSocketNotifier.Read:
+                notifiers = loop._readers
+            else:
+                notifiers = loop._writers
             if fd in notifiers and notifiers[fd] is qsn:
                 del notifiers[fd]
-        handler.cancel_callback = cancel 
+        handler.cancel_callback = cancel
         qsn.setEnabled(True)
         return qsn
 
     def add_reader(self, fd, callback, *args):
-        self._check_thread()
+        self._check_registration(fd, self._readers)
         handler = events.make_handler(callback, args)
+        if get_ident() != self._owner:
+            self.call_soon_threadsafe(self.add_reader, fd, handler)
+            return handler
         self._create_qsn(fd, QSocketNotifier.Read, handler)
         return handler
 
     def add_writer(self, fd, callback, *args):
-        self._check_thread()
+        self._check_registration(fd, self._writers)
         handler = events.make_handler(callback, args)
+        if get_ident() != self._owner:
+            self.call_soon_threadsafe(self.add_writer, fd, handler)
+            return handler
         self._create_qsn(fd, QSocketNotifier.Write, handler)
         return handler
 
     def remove_reader(self, fd):
+        if get_ident() != self._owner:
+            self.call_soon_threadsafe(self.remove_reader, fd)
+            return fd in self._readers
         qsn = self._readers.get(fd)
         if not qsn:
             return False
@@ -236,6 +443,9 @@ class PySideEventLoop(events.AbstractEventLoop):
         return True
 
     def remove_writer(self, fd):
+        if get_ident() != self._owner:
+            self.call_soon_threadsafe(self.remove_writer, fd)
+            return fd in self._writers
         qsn = self._writers.get(fd)
         if not qsn:
             return False
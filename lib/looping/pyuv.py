@@ -14,52 +14,312 @@ from __future__ import absolute_import, print_function
 import collections
 import errno
 import logging
+import os
 import pyuv
 import socket
 import sys
+import weakref
 
-try:
-    import signal
-except ImportError:
-    signal = None
+from . import base, events
+from .util import get_ident
 
-from . import events, winsocketpair
 
+class _UDPTransport(object):
+    """A datagram transport on a pyuv.UDP handle.
 
-class PyUVEventLoop(events.AbstractEventLoop):
+    libuv reads datagrams one at a time. They are collected during a loop
+    iteration and delivered to the protocol's datagrams_received() method with
+    a single call.
+    """
+
+    def __init__(self, loop, handle, protocol, address=None):
+        self._loop = loop
+        self._handle = handle
+        self._protocol = protocol
+        self._address = address
+        self._datagrams = []
+        self._closing = False
+        loop.call_soon(protocol.connection_made, self)
+        handle.start_recv(self._on_recv)
+
+    def get_extra_info(self, name, default=None):
+        if name == 'sockname':
+            return self._handle.getsockname()
+        elif name == 'peername':
+            return self._address
+        return default
+
+    def sendto(self, data, addr=None):
+        """Send a datagram to *addr*, or to the default address."""
+        if self._closing:
+            raise RuntimeError('transport is closing')
+        if addr is None:
+            addr = self._address
+        self._handle.send(addr, data, self._on_send)
+
+    def close(self):
+        if self._closing:
+            return
+        self._closing = True
+        self._handle.stop_recv()
+        self._handle.close()
+        self._loop.call_soon(self._call_connection_lost)
+
+    abort = close
+
+    def _call_connection_lost(self):
+        try:
+            self._protocol.connection_lost(None)
+        finally:
+            self._protocol = None
+
+    def _on_recv(self, handle, addr, flags, data, error):
+        if error is not None:
+            self._protocol.error_received(_uv_error(error))
+            return
+        if data is None:
+            return
+        if not self._datagrams:
+            self._loop.call_soon(self._deliver)
+        self._datagrams.append((data, addr))
+
+    def _on_send(self, handle, error):
+        if error is not None and self._protocol is not None:
+            self._protocol.error_received(_uv_error(error))
+
+    def _deliver(self):
+        datagrams, self._datagrams = self._datagrams, []
+        if datagrams and not self._closing:
+            self._protocol.datagrams_received(datagrams)
+
+
+class _FileOperation(object):
+    """A file read or write on libuv's thread pool, using pyuv.fs.
+
+    The file is opened, read or written in chunks, and closed. The outcome
+    is passed to ``callback(result, exc)``.
+    """
+
+    chunk_size = 256*1024
+
+    def __init__(self, loop, path, callback):
+        self._loop = loop
+        self._uvloop = loop._loop
+        self._path = path
+        self._callback = callback
+        self._fd = None
+
+    def _open(self, flags, mode, callback):
+        pyuv.fs.open(self._uvloop, self._path, flags, mode, callback)
+
+    def _finish(self, result, errorno=None):
+        if self._fd is not None:
+            pyuv.fs.close(self._uvloop, self._fd, lambda *args: None)
+            self._fd = None
+        exc = _uv_error(errorno, OSError) if errorno else None
+        self._loop.call_soon(self._callback, result, exc)
+
+
+class _FileRead(_FileOperation):
+
+    def __init__(self, loop, path, callback, offset, size):
+        super(_FileRead, self).__init__(loop, path, callback)
+        self._offset = offset
+        self._size = size
+        self._chunks = []
+
+    def start(self):
+        self._open(os.O_RDONLY, 0, self._on_open)
+
+    def _on_open(self, loop, path, fd, errorno):
+        if errorno:
+            return self._finish(None, errorno)
+        self._fd = fd
+        self._read()
+
+    def _read(self):
+        size = self.chunk_size
+        if self._size is not None:
+            size = min(size, self._size)
+        pyuv.fs.read(self._uvloop, self._fd, size, self._offset, self._on_read)
+
+    def _on_read(self, loop, path, data, errorno):
+        if errorno:
+            return self._finish(None, errorno)
+        if data:
+            self._chunks.append(data)
+            self._offset += len(data)
+            if self._size is not None:
+                self._size -= len(data)
+        if not data or self._size == 0:
+            return self._finish(b''.join(self._chunks))
+        self._read()
+
+
+class _FileWrite(_FileOperation):
+
+    def __init__(self, loop, path, callback, data, append):
+        super(_FileWrite, self).__init__(loop, path, callback)
+        self._view = memoryview(data)
+        self._append = append
+        self._offset = 0
+        self._written = 0
+
+    def start(self):
+        flags = os.O_WRONLY | os.O_CREAT
+        flags |= os.O_APPEND if self._append else os.O_TRUNC
+        self._open(flags, 0o644, self._on_open)
+
+    def _on_open(self, loop, path, fd, errorno):
+        if errorno:
+            return self._finish(None, errorno)
+        self._fd = fd
+        self._write()
+
+    def _write(self):
+        if not self._view:
+            return self._finish(self._written)
+        chunk = self._view[:self.chunk_size].tobytes()
+        # An offset of -1 writes at the current position, i.e. the end of
+        # the file with O_APPEND.
+        offset = -1 if self._append else self._offset
+        pyuv.fs.write(self._uvloop, self._fd, chunk, offset, self._on_write)
+
+    def _on_write(self, loop, path, nbytes, errorno):
+        if errorno:
+            return self._finish(None, errorno)
+        self._view = self._view[nbytes:]
+        self._offset += nbytes
+        self._written += nbytes
+        self._write()
+
+
+class _UVProcess(base.Process):
+    """A Process on a pyuv.Process handle, with pyuv.Pipe handles for its
+    output."""
+
+    def __init__(self, loop, args, stdout_cb, stderr_cb, exit_cb, cwd, env):
+        uvloop = loop._loop
+        self._handle = pyuv.Process(uvloop)
+        self._pipes = []
+        stdio = [pyuv.StdIO(flags=pyuv.UV_IGNORE)]
+        for callback, fd in ((stdout_cb, 1), (stderr_cb, 2)):
+            if callback is None and fd == 2:
+                stdio.append(pyuv.StdIO(fd=fd, flags=pyuv.UV_INHERIT_FD))
+                continue
+            pipe = pyuv.Pipe(uvloop)
+            pipe.stream = 'stdout' if fd == 1 else 'stderr'
+            stdio.append(pyuv.StdIO(stream=pipe, flags=pyuv.UV_CREATE_PIPE |
+                                                      pyuv.UV_WRITABLE_PIPE))
+            self._pipes.append(pipe)
+        kwargs = dict(file=args[0], exit_callback=self._on_exit,
+                      args=list(args[1:]), stdio=stdio)
+        # pyuv rejects None for these, so they are only passed when set.
+        if env is not None:
+            kwargs['env'] = env
+        if cwd is not None:
+            kwargs['cwd'] = cwd
+        try:
+            self._handle.spawn(**kwargs)
+        except pyuv.error.ProcessError as e:
+            self._handle.close()
+            for pipe in self._pipes:
+                pipe.close()
+            raise OSError(*e.args)
+        super(_UVProcess, self).__init__(self._handle.pid, stdout_cb,
+                                         stderr_cb, exit_cb)
+        for pipe in self._pipes:
+            pipe.start_read(self._on_read)
+            self._open_streams += 1
+
+    def send_signal(self, sig):
+        if self.returncode is None:
+            self._handle.kill(sig)
+
+    def _on_read(self, pipe, data, error):
+        if error is None:
+            self._data_received(pipe.stream, data)
+            return
+        pipe.close()
+        self._stream_closed()
+
+    def _on_exit(self, handle, exit_status, term_signal):
+        handle.close()
+        self._exited(exit_status, term_signal)
+
+
+def _uv_error(error, cls=socket.error):
+    # libuv has its own error numbers. Map them to the errno module's ones by
+    # name, so that callers can compare e.errno to errno.ENOENT etc.
+    name = pyuv.errno.errorcode.get(error, '')
+    code = getattr(errno, name[3:], error) if name.startswith('UV_') else error
+    return cls(code, pyuv.errno.strerror(error))
+
+
+def _stat_result(result):
+    # Convert a pyuv stat result to the os.stat_result that os.stat() returns.
+    # The first ten fields are in the same order.
+    extra = {'st_atime': float(result.st_atime),
+             'st_mtime': float(result.st_mtime),
+             'st_ctime': float(result.st_ctime),
+             'st_blksize': result.st_blksize,
+             'st_blocks': result.st_blocks,
+             'st_rdev': result.st_rdev}
+    return os.stat_result(tuple(result)[:10], extra)
+
+
+class PyUVEventLoop(base.BaseEventLoop):
     """A PEP3156 style EventLoop for libuv using pyuv."""
 
-    def __init__(self, loop=None):
-        super(PyUVEventLoop, self).__init__()
+    def __init__(self, loop=None, inbox_capacity=None, inbox_policy='block'):
+        super(PyUVEventLoop, self).__init__(inbox_capacity, inbox_policy)
         if loop is None:
             loop = pyuv.Loop.default_loop()
         self._loop = loop
         self._stop = False
+        self._timed_out = False
         self._last_exc = None
 
         self._fd_map = {}
-        self._signal_handlers = {}
         self._ready = collections.deque()
         self._timers = collections.deque()
+        self._fsevents = set()
+        # Set when a poll handle was started after the last uv_run(). libuv
+        # adds its fd to the backend only when the loop runs again.
+        self._registrations_pending = False
 
-        self._waker = pyuv.Async(self._loop, lambda h: None)
+        self._waker = pyuv.Async(self._loop, self._drain_inbox)
         self._waker.unref()
 
         self._ready_processor = pyuv.Check(self._loop)
         self._ready_processor.start(self._process_ready)
 
-    def _socketpair(self):
-        if hasattr(socket, 'socketpair'):
-            return socket.socketpair()
-        else:
-            return winsocketpair.socketpair()
+        self._idle_processor = pyuv.Idle(self._loop)
+
+        # A persistent timer that bounds the time spent in run_once() and
+        # run(), so that no timer is created per call.
+        self._run_timer = pyuv.Timer(self._loop)
 
-    def run(self):
+    def run(self, timeout=None):
+        self._set_owner()
         self._stop = False
-        while not self._stop and self._run_once():
-            pass
+        if timeout is None:
+            while not self._stop and self._run_once():
+                pass
+            return
+        # The timer only wakes up the loop, it does not keep it alive.
+        self._timed_out = False
+        self._run_timer.unref()
+        self._loop.update_time()
+        self._run_timer.start(self._run_timer_cb, timeout, 0)
+        try:
+            while not self._stop and not self._timed_out and self._run_once():
+                pass
+        finally:
+            self._run_timer.stop()
 
     def run_forever(self):
+        self._set_owner()
         handler = self.call_repeatedly(24*3600, lambda: None)
         try:
             self.run()
@@ -67,22 +327,51 @@ class PyUVEventLoop(events.AbstractEventLoop):
             handler.cancel()
 
     def run_once(self, timeout=None):
-        if timeout is not None:
-            timer = pyuv.Timer(self._loop)
-            timer.start(lambda x: None, timeout, 0)
-        self._run_once()
-        if timeout is not None:
-            timer.close()
+        self._set_owner()
+        if timeout is None:
+            self._run_once()
+            return
+        self._run_timer.ref()
+        self._loop.update_time()
+        self._run_timer.start(self._run_timer_cb, timeout, 0)
+        try:
+            self._run_once()
+        finally:
+            self._run_timer.stop()
+
+    def step(self):
+        self._set_owner()
+        self._run_once(block=False)
+
+    def backend_fd(self):
+        return self._loop.fileno()
+
+    def backend_timeout(self):
+        if self._ready or len(self._inbox) or self._idle:
+            return 0
+        if self._registrations_pending:
+            return 0
+        # pyuv returns the timeout in seconds, or -1 for no timeout.
+        timeout = self._loop.get_timeout()
+        if timeout < 0:
+            return None
+        if timeout == 0 and not self._loop_alive():
+            # libuv does not block when no handles keep the loop alive,
+            # but there is nothing to wake up for either.
+            return None
+        return timeout
 
     def stop(self):
         self._stop = True
         self._waker.send()
 
     def close(self):
+        if self._loop is None:
+            return
         self._fd_map.clear()
-        self._signal_handlers.clear()
         self._ready.clear()
         self._timers.clear()
+        self._fsevents.clear()
 
         self._waker.close()
         self._ready_processor.close()
@@ -94,46 +383,72 @@ class PyUVEventLoop(events.AbstractEventLoop):
         # Run a loop iteration so that close callbacks are called and resources are freed
         assert not self._loop.run(pyuv.UV_RUN_NOWAIT)
         self._loop = None
+        super(PyUVEventLoop, self).close()
 
     # Methods returning Handlers for scheduling callbacks.
 
     def call_later(self, delay, callback, *args):
+        if get_ident() != self._owner:
+            handler = events.make_timer(delay, callback, args)
+            self.call_soon_threadsafe(self.call_later, delay, handler)
+            return handler
+        handler = self._handlers.timer(delay, callback, args)
         if delay <= 0:
-            return self.call_soon(callback, *args)
-        handler = events.make_handler(callback, args)
+            return self.call_soon(handler)
         timer = pyuv.Timer(self._loop)
         timer.handler = handler
+        # libuv measures timeouts from its cached loop time, which is stale
+        # if the loop did not run recently. Refresh it so that the timer
+        # does not expire before the handler's deadline.
+        self._loop.update_time()
         timer.start(self._timer_cb, delay, 0)
         self._timers.append(timer)
+        # The timer handle references the handler. Reference the loop and
+        # the handle weakly from the handler to avoid a cycle.
+        lref = weakref.ref(self)
+        wref = weakref.ref(timer)
+        def reset(delay):
+            # Restarting an active uv timer re-keys it in libuv's timer heap.
+            loop, timer = lref(), wref()
+            if loop and timer and not timer.closed:
+                loop._loop.update_time()
+                timer.start(loop._timer_cb, max(delay, 0), 0)
+        if isinstance(handler, events.Timer):
+            handler.reset_callback = reset
         return handler
 
     def call_repeatedly(self, interval, callback, *args):  # NEW!
         if interval <= 0:
             raise ValueError('invalid interval specified: {}'.format(interval))
         handler = events.make_handler(callback, args)
+        if get_ident() != self._owner:
+            self.call_soon_threadsafe(self.call_repeatedly, interval, handler)
+            return handler
         timer = pyuv.Timer(self._loop)
         timer.handler = handler
+        self._loop.update_time()
         timer.start(self._timer_cb, interval, interval)
         self._timers.append(timer)
         return handler
 
     def call_soon(self, callback, *args):
-        handler = events.make_handler(callback, args)
+        if get_ident() != self._owner:
+            return self.call_soon_threadsafe(callback, *args)
+        handler = self._handlers.handler(callback, args)
         self._ready.append(handler)
         return handler
 
-    def call_soon_threadsafe(self, callback, *args):
-        handler = self.call_soon(callback, *args)
-        self._waker.send()
-        return handler
-
     # Level-trigered I/O methods.
     # The add_*() methods return a Handler.
     # The remove_*() methods return True if something was removed,
     # False if there was nothing to delete.
 
     def add_reader(self, fd, callback, *args):
+        self._check_registration(fd, self._fd_map)
         handler = events.make_handler(callback, args)
+        if get_ident() != self._owner:
+            self.call_soon_threadsafe(self.add_reader, fd, handler)
+            return handler
         try:
             poll_h = self._fd_map[fd]
         except KeyError:
@@ -144,11 +459,14 @@ class PyUVEventLoop(events.AbstractEventLoop):
 
         poll_h.pevents |= pyuv.UV_READABLE
         poll_h.read_handler = handler
-        poll_h.start(poll_h.pevents, self._poll_cb)
+        self._start_poll(poll_h)
 
         return handler
 
     def remove_reader(self, fd):
+        if get_ident() != self._owner:
+            self.call_soon_threadsafe(self.remove_reader, fd)
+            return fd in self._fd_map
         try:
             poll_h = self._fd_map[fd]
         except KeyError:
@@ -161,11 +479,15 @@ class PyUVEventLoop(events.AbstractEventLoop):
                 del self._fd_map[fd]
                 poll_h.close()
             else:
-                poll_h.start(poll_h.pevents, self._poll_cb)
+                self._start_poll(poll_h)
             return True
 
     def add_writer(self, fd, callback, *args):
+        self._check_registration(fd, self._fd_map)
         handler = events.make_handler(callback, args)
+        if get_ident() != self._owner:
+            self.call_soon_threadsafe(self.add_writer, fd, handler)
+            return handler
         try:
             poll_h = self._fd_map[fd]
         except KeyError:
@@ -176,11 +498,14 @@ class PyUVEventLoop(events.AbstractEventLoop):
 
         poll_h.pevents |= pyuv.UV_WRITABLE
         poll_h.write_handler = handler
-        poll_h.start(poll_h.pevents, self._poll_cb)
+        self._start_poll(poll_h)
 
         return handler
 
     def remove_writer(self, fd):
+        if get_ident() != self._owner:
+            self.call_soon_threadsafe(self.remove_writer, fd)
+            return fd in self._fd_map
         try:
             poll_h = self._fd_map[fd]
         except KeyError:
@@ -193,58 +518,212 @@ class PyUVEventLoop(events.AbstractEventLoop):
                 del self._fd_map[fd]
                 poll_h.close()
             else:
-                poll_h.start(poll_h.pevents, self._poll_cb)
+                self._start_poll(poll_h)
             return True
 
-    # Signal handling.
+    # Datagram endpoints.
 
-    def add_signal_handler(self, sig, callback, *args):
-        self._validate_signal(sig)
-        signal_h = pyuv.Signal(self._loop)
-        handler = events.make_handler(callback, args)
-        signal_h.handler = handler
+    def create_datagram_endpoint(self, protocol_factory, local_addr=None,
+                                 remote_addr=None, family=socket.AF_INET,
+                                 batch_size=64):
+        """Create a datagram endpoint on a pyuv.UDP handle.
+
+        Only IPv4 endpoints use pyuv.UDP. Other families use the
+        add_reader() based transport of the base class. With pyuv.UDP, all
+        datagrams received in one loop iteration are delivered together, and
+        *batch_size* is not used.
+        """
+        if family != socket.AF_INET:
+            return super(PyUVEventLoop, self).create_datagram_endpoint(
+                    protocol_factory, local_addr, remote_addr, family,
+                    batch_size)
+        handle = pyuv.UDP(self._loop)
         try:
-            signal_h.start(self._signal_cb, sig)
-        except Exception as e:
-            signal_h.close()
-            raise RuntimeError(str(e))
-        else:
-            self._signal_handlers[sig] = signal_h
+            handle.bind(local_addr or ('0.0.0.0', 0))
+        except pyuv.error.UDPError as e:
+            handle.close()
+            raise socket.error(*e.args)
+        protocol = protocol_factory()
+        transport = _UDPTransport(self, handle, protocol, remote_addr)
+        return transport, protocol
+
+    # File I/O, on libuv's thread pool.
+
+    def read_file(self, path, callback, offset=0, size=None):
+        _FileRead(self, path, callback, offset, size).start()
+
+    def write_file(self, path, data, callback, append=False):
+        _FileWrite(self, path, callback, data, append).start()
+
+    def stat(self, path, callback):
+        def on_stat(loop, path, result, errorno):
+            if errorno:
+                callback(None, _uv_error(errorno, OSError))
+            else:
+                callback(_stat_result(result), None)
+        pyuv.fs.stat(self._loop, path, on_stat)
+
+    # File change watching.
+
+    def watch_path(self, path, callback):
+        """Watch the file or directory at *path* for changes.
+
+        This uses a pyuv.fs.FSEvent handle. See
+        :meth:`BaseEventLoop.watch_path` for the callback arguments.
+        """
+        handler = events.Handler(callback, ())
+        fsevent_h = pyuv.fs.FSEvent(self._loop, path, self._fsevent_cb, 0)
+        fsevent_h.handler = handler
+        fsevent_h.watched_path = path
+        fsevent_h.changes = collections.OrderedDict()
+        self._fsevents.add(fsevent_h)
+        # Reference the loop and the handle weakly from the handler to
+        # avoid a cycle, like call_later() does.
+        lref = weakref.ref(self)
+        wref = weakref.ref(fsevent_h)
+        def cancel():
+            loop, fsevent_h = lref(), wref()
+            if loop is None or fsevent_h is None:
+                return
+            if get_ident() != loop._owner:
+                loop.call_soon_threadsafe(loop._close_fsevent, fsevent_h)
+            else:
+                loop._close_fsevent(fsevent_h)
+        handler.cancel_callback = cancel
         return handler
 
-    def remove_signal_handler(self, sig):
-        self._validate_signal(sig)
-        try:
-            signal_h = self._signal_handlers.pop(sig)
-        except KeyError:
-            return False
-        del signal_h.handler
-        signal_h.close()
-        return True
+    def _close_fsevent(self, fsevent_h):
+        if fsevent_h not in self._fsevents:
+            return
+        self._fsevents.remove(fsevent_h)
+        fsevent_h.changes.clear()
+        del fsevent_h.handler
+        fsevent_h.close()
+
+    def _fsevent_cb(self, fsevent_h, filename, fs_events, error):
+        if fsevent_h.handler.cancelled:
+            self._close_fsevent(fsevent_h)
+            return
+        if error is not None:
+            return
+        # Merge all events of one loop iteration into a single callback.
+        if not fsevent_h.changes:
+            self._ready.append(events.Handler(self._deliver_fsevents,
+                                              (fsevent_h,)))
+        filename = filename or os.path.basename(fsevent_h.watched_path)
+        changes = fsevent_h.changes
+        changes[filename] = changes.get(filename, 0) | fs_events
+
+    def _deliver_fsevents(self, fsevent_h):
+        changes = list(fsevent_h.changes.items())
+        fsevent_h.changes.clear()
+        handler = getattr(fsevent_h, 'handler', None)
+        if handler is not None and not handler.cancelled:
+            handler.callback(changes)
+
+    # Child processes.
+
+    def spawn_process(self, args, stdout_cb=None, exit_cb=None, stderr_cb=None,
+                      cwd=None, env=None):
+        """Start a child process using pyuv.Process.
+
+        See :meth:`BaseEventLoop.spawn_process` for the arguments.
+        """
+        return _UVProcess(self, args, stdout_cb, stderr_cb, exit_cb, cwd, env)
 
     # Private / internal methods
 
-    def _run_once(self):
+    def _add_internal_reader(self, fd, callback):
+        handler = super(PyUVEventLoop, self)._add_internal_reader(fd, callback)
+        self._fd_map[fd].unref()
+        return handler
+
+    def _resources(self):
+        for resource in super(PyUVEventLoop, self)._resources():
+            yield resource
+        for poll_h in self._fd_map.values():
+            if poll_h.read_handler is not None:
+                yield 'readers', poll_h, poll_h.read_handler
+            if poll_h.write_handler is not None:
+                yield 'writers', poll_h, poll_h.write_handler
+        for timer in self._timers:
+            yield 'timers', timer, getattr(timer, 'handler', None)
+        for handler in self._ready:
+            yield 'ready', handler, handler
+        for fsevent_h in self._fsevents:
+            yield 'watches', fsevent_h, fsevent_h.handler
+
+    def _pending_work(self):
+        if self._ready or len(self._inbox):
+            return True
+        for poll_h in self._fd_map.values():
+            handler = poll_h.write_handler
+            if handler is not None and not handler.cancelled:
+                return True
+        return False
+
+    def _abandon(self):
+        self._drain_inbox()
+        abandoned = dict.fromkeys(('callbacks', 'timers', 'readers', 'writers'), 0)
+        for handler in list(self._ready) + list(self._idle):
+            if not handler.cancelled:
+                handler.cancel()
+                abandoned['callbacks'] += 1
+        self._ready.clear()
+        self._idle.clear()
+        for timer in self._timers:
+            if not timer.handler.cancelled:
+                timer.handler.cancel()
+                abandoned['timers'] += 1
+            timer.close()
+        self._timers.clear()
+        for fd, poll_h in list(self._fd_map.items()):
+            if fd in self._internal_fds:
+                continue
+            for handler, key in ((poll_h.read_handler, 'readers'),
+                                 (poll_h.write_handler, 'writers')):
+                if handler is not None and not handler.cancelled:
+                    handler.cancel()
+                    abandoned[key] += 1
+            poll_h.close()
+            del self._fd_map[fd]
+        return abandoned
+
+    def _wakeup(self):
+        self._waker.send()
+
+    def _drain_inbox(self, handle=None):
+        self._ready.extend(self._inbox.swap())
+
+    def _run_once(self, block=True):
         # Check if there are cancelled timers, if so close the handles
         for timer in [timer for timer in self._timers if timer.handler.cancelled]:
             timer.close()
             self._timers.remove(timer)
             del timer.handler
 
+        self._drain_inbox()
         # If there is something ready to be run, prevent the loop from blocking for i/o
         if self._ready:
             self._ready_processor.ref()
             mode = pyuv.UV_RUN_NOWAIT
         else:
             self._ready_processor.unref()
-            mode = pyuv.UV_RUN_ONCE
+            mode = pyuv.UV_RUN_ONCE if block else pyuv.UV_RUN_NOWAIT
 
+        self._registrations_pending = False
         r = self._loop.run(mode)
         if self._last_exc is not None:
             exc, self._last_exc = self._last_exc, None
             raise exc[1]
         return r
 
+    def _run_timer_cb(self, timer):
+        # Stopping the uv loop makes it skip polling for I/O in the current
+        # iteration.
+        self._timed_out = True
+        self._loop.stop()
+
     def _timer_cb(self, timer):
         if timer.handler.cancelled:
             del timer.handler
@@ -253,16 +732,12 @@ class PyUVEventLoop(events.AbstractEventLoop):
             return
         self._ready.append(timer.handler)
         if not timer.repeat:
+            if isinstance(timer.handler, events.Timer):
+                timer.handler.reset_callback = None
             del timer.handler
             self._timers.remove(timer)
             timer.close()
 
-    def _signal_cb(self, signal_h, signum):
-        if signal_h.handler.cancelled:
-            self.remove_signal_handler(signum)
-            return
-        self._ready.append(signal_h.handler)
-
     def _poll_cb(self, poll_h, events, error):
         fd = poll_h.fileno()
         if error is not None:
@@ -305,7 +780,20 @@ class PyUVEventLoop(events.AbstractEventLoop):
         if not modified and old_events != poll_h.pevents:
             # Rearm the handle
             poll_h.stop()
-            poll_h.start(poll_h.pevents, self._poll_cb)
+            self._start_poll(poll_h)
+
+    def _start_idle(self):
+        self._idle_processor.start(self._process_idle)
+
+    def _process_idle(self, handle):
+        # An active idle handle makes the loop poll for I/O without
+        # blocking. Idle callbacks are moved to the ready queue only when
+        # it is empty, and are called by _process_ready().
+        if self._ready:
+            return
+        self._ready.extend(self._next_idle_batch())
+        if not self._idle:
+            handle.stop()
 
     def _process_ready(self, handle):
         # This is the only place where callbacks are actually *called*.
@@ -325,11 +813,29 @@ class PyUVEventLoop(events.AbstractEventLoop):
                 except BaseException:
                     self._last_exc = sys.exc_info()
                     break
+            self._handlers.release(handler)
         if not self._ready:
             self._ready_processor.unref()
         else:
             self._ready_processor.ref()
 
+    def _loop_alive(self):
+        # pyuv does not expose the reference count of a handle, so skip the
+        # handles that this loop unreferences.
+        unref = set([self._waker, self._ready_processor, self._run_timer])
+        unref.update(self._fd_map[fd] for fd in self._internal_fds
+                     if fd in self._fd_map)
+        alive = []
+        def cb(handle):
+            if handle.closed or (handle.active and handle not in unref):
+                alive.append(handle)
+        self._loop.walk(cb)
+        return bool(alive)
+
+    def _start_poll(self, poll_h):
+        poll_h.start(poll_h.pevents, self._poll_cb)
+        self._registrations_pending = True
+
     def _create_poll_handle(self, fdobj):
         poll_h = pyuv.Poll(self._loop, self._fileobj_to_fd(fdobj))
         poll_h.pevents = 0
@@ -354,18 +860,3 @@ class PyUVEventLoop(events.AbstractEventLoop):
             except (ValueError, TypeError):
                 raise ValueError("Invalid file object: {!r}".format(fileobj))
         return fd
-
-    def _validate_signal(self, sig):
-        """Internal helper to validate a signal.
-
-        Raise ValueError if the signal number is invalid or uncatchable.
-        Raise RuntimeError if there is a problem setting up the handler.
-        """
-        if not isinstance(sig, int):
-            raise TypeError('sig must be an int, not {!r}'.format(sig))
-        if signal is None:
-            raise RuntimeError('Signals are not supported')
-        if not (1 <= sig < signal.NSIG):
-            raise ValueError('sig {} out of range(1, {})'.format(sig, signal.NSIG))
-        if sys.platform == 'win32':
-            raise RuntimeError('Signals are not really supported on Windows')
@@ -0,0 +1,211 @@
+#
+# This file is part of looping. Looping is free software available under the
+# terms of the Apache 2.0 license. See the file "LICENSE" that was provided
+# together with this source file for the licensing terms.
+#
+# Copyright (c) 2012-2013 the authors. See the file "AUTHORS" for a complete
+# list.
+
+"""A pre-forking server runner.
+
+The runner forks a number of worker processes. Each worker owns an event
+loop and a listening socket that is bound to the same address with
+SO_REUSEPORT, so that the kernel distributes incoming connections over the
+workers. The parent process supervises the workers and restarts them when
+they exit unexpectedly. Availability: Unix.
+"""
+
+from __future__ import absolute_import, print_function
+
+__all__ = ['ReusePortServer']
+
+import errno
+import logging
+import os
+import signal
+import socket
+import time
+
+from . import base, pool
+
+
+def create_reuseport_socket(host, port, family=socket.AF_INET, backlog=128):
+    """Create a listening socket bound to (host, port) with SO_REUSEPORT."""
+    if not hasattr(socket, 'SO_REUSEPORT'):
+        raise RuntimeError('SO_REUSEPORT is not supported on this platform')
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        sock.bind((host, port))
+        sock.listen(backlog)
+        sock.setblocking(False)
+    except Exception:
+        sock.close()
+        raise
+    return sock
+
+
+class ReusePortServer(object):
+    """Run a server in a number of worker processes that share one port.
+
+    The *worker* argument is a callable that is called in each worker
+    process as ``worker(loop, sock)``, where *loop* is a new event loop
+    created by *loop_factory* and *sock* is a non-blocking listening socket.
+    It should register the socket with the loop, e.g. using ``add_reader()``.
+    The worker process then runs the loop until it is stopped.
+
+    The number of worker processes is specified by *workers* and defaults to
+    the number of CPUs.
+
+    The parent process handles SIGTERM and SIGINT by forwarding SIGTERM to
+    the workers, which stops their loops, and then waits at most
+    *shutdown_timeout* seconds for them to exit before killing them. The
+    signals in *forward_signals* are forwarded to the workers as-is, where
+    they are passed to :meth:`handle_worker_signal`.
+    """
+
+    stop_signals = (signal.SIGTERM, signal.SIGINT)
+    forward_signals = (signal.SIGHUP, signal.SIGUSR1, signal.SIGUSR2)
+
+    # A worker that exits within this many seconds after it was started is
+    # restarted with a delay, to prevent a tight fork loop.
+    min_lifetime = 1.0
+    restart_delay = 1.0
+
+    def __init__(self, worker, host, port, workers=None, loop_factory=None,
+                 family=socket.AF_INET, backlog=128, shutdown_timeout=10):
+        if workers is None:
+            workers = pool._cpu_count()
+        if workers < 1:
+            raise ValueError('invalid number of workers: {}'.format(workers))
+        self._worker = worker
+        self._address = (host, port)
+        self._family = family
+        self._backlog = backlog
+        self._nworkers = workers
+        self._loop_factory = loop_factory or pool._default_loop_factory
+        self._shutdown_timeout = shutdown_timeout
+        self._children = {}
+        self._stopping = False
+        self._loop = None
+
+    @property
+    def pids(self):
+        """The process IDs of the running workers."""
+        return list(self._children)
+
+    def run(self):
+        """Start the workers and supervise them until the server is stopped.
+
+        This must be called from the main thread.
+        """
+        loop = self._loop = self._loop_factory()
+        try:
+            loop.add_signal_handler(signal.SIGCHLD, self._reap_children)
+            for sig in self.stop_signals:
+                loop.add_signal_handler(sig, self.stop)
+            for sig in self.forward_signals:
+                loop.add_signal_handler(sig, self._forward_signal, sig)
+            for i in range(self._nworkers):
+                self._spawn_worker()
+            loop.run_forever()
+        finally:
+            self._loop = None
+            for sig in (signal.SIGCHLD,) + self.stop_signals + self.forward_signals:
+                loop.remove_signal_handler(sig)
+            loop.close()
+
+    def stop(self):
+        """Stop the server gracefully."""
+        if self._stopping:
+            return
+        self._stopping = True
+        if not self._children:
+            self._loop.stop()
+            return
+        self._forward_signal(signal.SIGTERM)
+        self._loop.call_later(self._shutdown_timeout, self._kill_workers)
+
+    def handle_worker_signal(self, loop, sig):
+        """Called in a worker when it receives one of *forward_signals*.
+
+        The default implementation does nothing. Subclasses can override
+        this, e.g. to reload the configuration on SIGHUP.
+        """
+
+    def _forward_signal(self, sig):
+        for pid in self._children:
+            try:
+                os.kill(pid, sig)
+            except OSError as e:
+                if e.errno != errno.ESRCH:
+                    raise
+
+    def _kill_workers(self):
+        if self._children:
+            logging.warning('Killing %d workers that did not exit within %ss',
+                            len(self._children), self._shutdown_timeout)
+            self._forward_signal(signal.SIGKILL)
+
+    def _spawn_worker(self):
+        if self._stopping:
+            return
+        pid = os.fork()
+        if pid == 0:
+            status = 1
+            try:
+                self._run_worker()
+                status = 0
+            except BaseException:
+                logging.exception('Uncaught exception in worker')
+            finally:
+                os._exit(status)
+        self._children[pid] = time.time()
+
+    def _run_worker(self):
+        # The parent's signal handlers and wakeup fd are inherited over
+        # fork(). Reset them so that signals sent to the worker are handled
+        # by the worker's own loop only. The parent's loop is left alone,
+        # because its backend may share kernel state with the parent.
+        base._signal_dispatcher.after_fork()
+        loop = self._loop_factory()
+        sock = create_reuseport_socket(self._address[0], self._address[1],
+                                       self._family, self._backlog)
+        try:
+            for sig in self.stop_signals:
+                loop.add_signal_handler(sig, loop.stop)
+            for sig in self.forward_signals:
+                loop.add_signal_handler(sig, self.handle_worker_signal,
+                                        loop, sig)
+            self._worker(loop, sock)
+            loop.run_forever()
+        finally:
+            sock.close()
+            loop.close()
+
+    def _reap_children(self):
+        while self._children:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except OSError as e:
+                if e.errno == errno.EINTR:
+                    continue
+                if e.errno != errno.ECHILD:
+                    raise
+                break
+            if pid == 0:
+                break
+            started = self._children.pop(pid, None)
+            if started is None:
+                continue
+            if self._stopping:
+                continue
+            logging.warning('Worker %d exited with status %d, restarting',
+                            pid, status)
+            if time.time() - started < self.min_lifetime:
+                self._loop.call_later(self.restart_delay, self._spawn_worker)
+            else:
+                self._spawn_worker()
+        if self._stopping and not self._children:
+            self._loop.stop()
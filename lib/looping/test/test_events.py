@@ -20,11 +20,13 @@ import io
 import select
 import signal
 import socket
+import subprocess
 try:
     import ssl
 except ImportError:
     ssl = None
 import sys
+import tempfile
 import threading
 import time
 import unittest
@@ -34,7 +36,7 @@ except ImportError:
     import mock
 
 import looping
-from looping import events, util
+from looping import base, events, inbox, util
 from looping.test import test_utils
 
 
@@ -90,6 +92,13 @@ class EventLoopTestsMixin(object):
         self.event_loop.run()
         self.assertEqual(results, ['yeah'])
 
+    def test_call_later_with_handler(self):
+        results = []
+        handler = events.Handler(results.append, ('yeah',))
+        self.assertIs(self.event_loop.call_later(0.01, handler), handler)
+        self.event_loop.run()
+        self.assertEqual(results, ['yeah'])
+
     def test_call_soon_threadsafe(self):
         results = []
         def callback(arg):
@@ -135,6 +144,59 @@ class EventLoopTestsMixin(object):
         self.assertEqual(results, ['hello', 'world'])
         self.assertTrue(t1-t0 >= 0.08)
 
+    def test_call_batch_threadsafe(self):
+        results = []
+        def callback(arg):
+            results.append(arg)
+        def run():
+            self.event_loop.call_batch_threadsafe(
+                [(callback, ('hello',)), events.Handler(callback, ('there',))])
+        t = threading.Thread(target=run)
+        self.event_loop.call_later(0.1, callback, 'world')
+        t.start()
+        self.event_loop.run()
+        t.join()
+        self.assertEqual(results, ['hello', 'there', 'world'])
+
+    def test_call_batch_threadsafe_owner(self):
+        # A full bounded inbox must not block the loop's own thread.
+        self.event_loop._inbox = inbox.Inbox(1, 'block', self.event_loop._wakeup)
+        self.event_loop._inbox.put(events.Handler(lambda: None, ()))
+        results = []
+        self.event_loop.call_batch_threadsafe(
+            [(results.append, (i,)) for i in range(3)])
+        self.event_loop.run()
+        self.assertEqual(results, [0, 1, 2])
+
+    def test_call_later_other_thread(self):
+        results = []
+        def callback(arg):
+            results.append(arg)
+        def run():
+            self.event_loop.call_later(0.05, callback, 'hello')
+        t = threading.Thread(target=run)
+        self.event_loop.call_later(0.1, callback, 'world')
+        t.start()
+        t.join()
+        self.event_loop.run()
+        self.assertEqual(results, ['hello', 'world'])
+
+    def test_add_reader_other_thread(self):
+        r, w = self.event_loop._socketpair()
+        bytes_read = []
+        def reader():
+            bytes_read.append(r.recv(1024))
+            self.event_loop.remove_reader(r.fileno())
+        t = threading.Thread(target=self.event_loop.add_reader,
+                             args=(r.fileno(), reader))
+        t.start()
+        t.join()
+        self.event_loop.call_later(0.05, w.send, b'abc')
+        self.event_loop.run()
+        r.close()
+        w.close()
+        self.assertEqual(bytes_read, [b'abc'])
+
     def test_reader_callback(self):
         r, w = self.event_loop._socketpair()
         bytes_read = []
@@ -256,6 +318,181 @@ class EventLoopTestsMixin(object):
         r.close()
         self.assertTrue(data == b'x'*256)
 
+    def check_sock_sendfile(self, offset, count, expected):
+        data = os.urandom(300*1024)
+        with tempfile.TemporaryFile() as f:
+            f.write(data)
+            f.flush()
+            r, w = self.event_loop._socketpair()
+            r.setblocking(False)
+            received = []
+            result = []
+            def reader():
+                try:
+                    received.append(r.recv(65536))
+                except socket.error:
+                    pass
+            def done(nbytes, exc):
+                result.append((nbytes, exc))
+                w.close()
+            self.event_loop.add_reader(r.fileno(), reader)
+            self.event_loop.sock_sendfile(w, f, offset, count, done)
+            def check():
+                if received and not received[-1]:
+                    self.event_loop.remove_reader(r.fileno())
+                else:
+                    self.event_loop.call_later(0.01, check)
+            self.event_loop.call_later(0.01, check)
+            self.event_loop.run()
+            r.close()
+        self.assertEqual(result, [(len(expected(data)), None)])
+        self.assertEqual(b''.join(received), expected(data))
+
+    def test_sock_sendfile(self):
+        self.check_sock_sendfile(0, None, lambda data: data)
+        self.check_sock_sendfile(1000, 200000, lambda data: data[1000:201000])
+
+    def test_sock_sendfile_fallback(self):
+        with mock.patch('looping.base._Sendfile.use_sendfile', False):
+            self.check_sock_sendfile(0, None, lambda data: data)
+            self.check_sock_sendfile(70000, None, lambda data: data[70000:])
+            # A count past the end of file sends up to the end.
+            self.check_sock_sendfile(1000, 400*1024, lambda data: data[1000:])
+            self.check_sock_sendfile(400*1024, 1000, lambda data: b'')
+
+    def test_file_io(self):
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+        results = []
+        def on_stat(st, exc):
+            self.assertIsInstance(st, os.stat_result)
+            results.append(('stat', st.st_size, exc))
+        def on_read(data, exc):
+            results.append(('read', data, exc))
+            self.event_loop.stat(path, on_stat)
+        def on_append(nbytes, exc):
+            results.append(('append', nbytes, exc))
+            self.event_loop.read_file(path, on_read, 2, 5)
+        def on_write(nbytes, exc):
+            results.append(('write', nbytes, exc))
+            self.event_loop.write_file(path, b'bar', on_append, append=True)
+        self.event_loop.write_file(path, b'foo', on_write)
+        self.event_loop.call_later(0.5, lambda: None)
+        self.event_loop.run()
+        os.unlink(path)
+        self.assertEqual(results, [('write', 3, None), ('append', 3, None),
+                                   ('read', b'obar', None),
+                                   ('stat', 6, None)])
+
+    def test_file_io_error(self):
+        results = []
+        def callback(result, exc):
+            results.append((result, exc))
+        path = os.path.join(tempfile.gettempdir(), 'looping-nonexistent')
+        self.event_loop.read_file(path, callback)
+        self.event_loop.call_later(0.2, lambda: None)
+        self.event_loop.run()
+        self.assertEqual(len(results), 1)
+        self.assertIsNone(results[0][0])
+        self.assertIsInstance(results[0][1], OSError)
+        self.assertEqual(results[0][1].errno, errno.ENOENT)
+
+    @unittest.skipUnless(sys.platform.startswith('linux'), 'Linux only')
+    def test_watch_path(self):
+        dirname = tempfile.mkdtemp()
+        batches = []
+        def callback(changes):
+            batches.append(changes)
+        handler = self.event_loop.watch_path(dirname, callback)
+        def create_files():
+            for i in range(3):
+                with open(os.path.join(dirname, 'file{}'.format(i)), 'w') as f:
+                    f.write('foo')
+        self.event_loop.call_later(0.05, create_files)
+        self.event_loop.call_later(0.2, handler.cancel)
+        self.event_loop.call_later(0.25, create_files)
+        self.event_loop.call_later(0.3, lambda: None)
+        self.event_loop.run()
+        names = set(name for batch in batches for name, flags in batch)
+        self.assertEqual(names, set(['file0', 'file1', 'file2']))
+        self.assertTrue(len(batches) < 6)
+        for i in range(3):
+            os.unlink(os.path.join(dirname, 'file{}'.format(i)))
+        os.rmdir(dirname)
+
+    def test_watch_path_cancel(self):
+        dirname = tempfile.mkdtemp()
+        self.addCleanup(os.rmdir, dirname)
+        handler = self.event_loop.watch_path(dirname, lambda changes: None)
+        self.assertEqual(self.event_loop.resource_report()['watches']['count'], 1)
+        handler.cancel()
+        self.assertNotIn('watches', self.event_loop.resource_report())
+
+    def test_watch_path_deleted(self):
+        dirname = tempfile.mkdtemp()
+        batches = []
+        handler = self.event_loop.watch_path(dirname, batches.append)
+        self.event_loop.call_later(0.05, os.rmdir, dirname)
+        self.event_loop.call_later(0.2, handler.cancel)
+        self.event_loop.run()
+        names = set(name for batch in batches for name, flags in batch)
+        self.assertEqual(names, set([os.path.basename(dirname)]))
+        self.assertNotIn('watches', self.event_loop.resource_report())
+
+    @unittest.skipIf(sys.platform == 'win32', 'Unix only')
+    def test_spawn_process(self):
+        output = []
+        result = []
+        def exit_cb(exit_status, term_signal):
+            result.append((exit_status, term_signal))
+        code = 'import sys; sys.stdout.write("hello"); sys.exit(3)'
+        proc = self.event_loop.spawn_process([sys.executable, '-c', code],
+                                             output.append, exit_cb)
+        self.assertIsInstance(proc.pid, int)
+        self.event_loop.run()
+        self.assertEqual(b''.join(output), b'hello')
+        self.assertEqual(result, [(3, 0)])
+        self.assertEqual(proc.returncode, 3)
+
+    @unittest.skipIf(sys.platform == 'win32', 'Unix only')
+    def test_spawn_process_kill(self):
+        result = []
+        def exit_cb(exit_status, term_signal):
+            result.append(term_signal)
+        code = 'import time; time.sleep(10)'
+        errors = []
+        proc = self.event_loop.spawn_process([sys.executable, '-c', code],
+                                             exit_cb=exit_cb,
+                                             stderr_cb=errors.append)
+        self.event_loop.call_later(0.1, proc.terminate)
+        self.event_loop.run()
+        self.assertEqual(result, [signal.SIGTERM])
+        self.assertEqual(proc.returncode, -signal.SIGTERM)
+
+    @unittest.skipIf(sys.platform == 'win32', 'Unix only')
+    def test_spawn_process_cwd_env(self):
+        output = []
+        dirname = os.path.realpath(tempfile.mkdtemp())
+        self.addCleanup(os.rmdir, dirname)
+        code = 'import os, sys; sys.stdout.write(os.getcwd() + ":" + ' \
+               'os.environ["LOOPING_TEST"])'
+        env = dict(os.environ, LOOPING_TEST='foo')
+        self.event_loop.spawn_process([sys.executable, '-c', code],
+                                      output.append, cwd=dirname, env=env)
+        self.event_loop.run()
+        self.assertEqual(b''.join(output).decode('ascii'),
+                         '{}:foo'.format(dirname))
+
+    @unittest.skipIf(sys.platform == 'win32', 'Unix only')
+    def test_spawn_many_processes(self):
+        results = []
+        def exit_cb(exit_status, term_signal):
+            results.append(exit_status)
+        for i in range(20):
+            self.event_loop.spawn_process(['true'], exit_cb=exit_cb)
+        self.event_loop.run()
+        self.assertEqual(results, [0] * 20)
+
     @unittest.skipUnless(hasattr(signal, 'SIGKILL'), 'No SIGKILL')
     def test_add_signal_handler(self):
         caught = [0]
@@ -324,6 +561,227 @@ class EventLoopTestsMixin(object):
         self.event_loop.run_forever()
         self.assertEqual(caught[0], 1)
 
+    def test_run_until_complete(self):
+        future = looping.Future(self.event_loop)
+        self.event_loop.call_later(0.01, future.set_result, 42)
+        self.assertEqual(self.event_loop.run_until_complete(future), 42)
+
+    def test_run_until_complete_timeout(self):
+        future = looping.Future(self.event_loop)
+        self.assertRaises(looping.TimeoutError,
+                          self.event_loop.run_until_complete, future, 0.01)
+        self.assertFalse(future.done())
+
+    def test_call_timeout(self):
+        self.event_loop.timeout_granularity = 0.01
+        results = []
+        t0 = util.monotonic()
+        self.event_loop.call_timeout(0.05, results.append, 'expired')
+        for i in range(100):
+            handler = self.event_loop.call_timeout(0.02, results.append, i)
+            handler.cancel()
+        self.event_loop.run()
+        self.assertEqual(results, ['expired'])
+        self.assertGreaterEqual(util.monotonic() - t0, 0.05)
+        self.assertEqual(self.event_loop._timeouts, {})
+        self.assertIsNone(self.event_loop._timeout_ticker)
+
+    def test_call_later_reset(self):
+        results = []
+        t0 = util.monotonic()
+        timer = self.event_loop.call_later(0.05, results.append, 'expired')
+        self.assertIsInstance(timer, events.Timer)
+        self.event_loop.call_later(0.03, timer.reset, 0.1)
+        self.event_loop.run()
+        self.assertEqual(results, ['expired'])
+        self.assertGreaterEqual(util.monotonic() - t0, 0.12)
+        self.assertRaises(RuntimeError, timer.reset)
+
+    def test_call_later_extend(self):
+        results = []
+        t0 = util.monotonic()
+        timer = self.event_loop.call_later(0.05, results.append, 'expired')
+        timer.extend(0.05)
+        self.event_loop.run()
+        self.assertEqual(results, ['expired'])
+        self.assertGreaterEqual(util.monotonic() - t0, 0.09)
+
+    def test_run_timeout(self):
+        results = []
+        self.event_loop.call_later(10, results.append, 'late')
+        t0 = util.monotonic()
+        self.event_loop.run(0.05)
+        self.assertLess(util.monotonic() - t0, 1)
+        self.assertEqual(results, [])
+        self.event_loop.call_soon(results.append, 'soon')
+        self.event_loop.run_until(util.monotonic() + 0.05)
+        self.assertEqual(results, ['soon'])
+
+    def test_run_once_timeout(self):
+        t0 = util.monotonic()
+        for i in range(5):
+            self.event_loop.run_once(0.01)
+        self.assertGreaterEqual(util.monotonic() - t0, 0.04)
+
+    def test_step(self):
+        results = []
+        self.event_loop.call_soon(results.append, 1)
+        self.event_loop.call_later(10, results.append, 2)
+        t0 = util.monotonic()
+        self.event_loop.step()
+        self.assertLess(util.monotonic() - t0, 1)
+        self.assertEqual(results, [1])
+
+    def test_handler_pool(self):
+        self.event_loop._handlers = events.HandlerPool(16)
+        results = []
+        def callback(i):
+            results.append(i)
+            if i < 100:
+                self.event_loop.call_soon(callback, i+1)
+        self.event_loop.call_soon(callback, 0)
+        held = self.event_loop.call_later(0.01, results.append, 'timer')
+        self.event_loop.run()
+        self.assertEqual(results, list(range(101)) + ['timer'])
+        self.assertEqual(held.generation, 0)
+        self.assertGreater(len(self.event_loop._handlers), 0)
+
+    def test_resource_report(self):
+        r, w = self.event_loop._socketpair()
+        self.addCleanup(r.close)
+        self.addCleanup(w.close)
+        self.event_loop.add_reader(r.fileno(), lambda: None)
+        for i in range(3):
+            self.event_loop.call_later(10, lambda: None)
+        report = self.event_loop.resource_report()
+        self.assertEqual(report['readers']['count'], 1)
+        self.assertEqual(report['timers']['count'], 3)
+        self.assertGreater(report['timers']['bytes'], 0)
+        self.assertNotIn('sources', report['timers'])
+
+    def test_resource_report_debug(self):
+        events.set_debug(True)
+        self.addCleanup(events.set_debug, False)
+        self.event_loop.call_later(10, lambda: None)
+        report = self.event_loop.resource_report()
+        sources = report['timers']['sources']
+        self.assertEqual(len(sources), 1)
+        source = list(sources)[0]
+        self.assertIn('test_resource_report_debug', source)
+
+    def test_no_handler_cycles(self):
+        r, w = self.event_loop._socketpair()
+        self.addCleanup(r.close)
+        self.addCleanup(w.close)
+        gc.collect()
+        gc.disable()
+        try:
+            for i in range(100):
+                self.event_loop.call_later(10, lambda: None).cancel()
+                timer = self.event_loop.call_later(10, lambda: None)
+                timer.reset(5)
+                timer.cancel()
+                self.event_loop.call_timeout(10, lambda: None).cancel()
+                self.event_loop.call_soon(lambda: None)
+                self.event_loop.add_reader(r.fileno(), lambda: None)
+                self.event_loop.remove_reader(r.fileno())
+            del timer
+            self.event_loop.run()
+            gc.set_debug(gc.DEBUG_SAVEALL)
+            gc.collect()
+            cycles = [obj for obj in gc.garbage
+                      if isinstance(obj, events.Handler)]
+        finally:
+            gc.set_debug(0)
+            del gc.garbage[:]
+            gc.enable()
+        self.assertEqual(cycles, [])
+
+    def test_call_when_idle(self):
+        results = []
+        def callback(arg):
+            results.append(arg)
+        self.event_loop.call_when_idle(callback, 'idle')
+        self.event_loop.call_soon(callback, 'soon')
+        self.event_loop.run()
+        self.assertEqual(results, ['soon', 'idle'])
+
+    def test_call_when_idle_budget(self):
+        self.event_loop.idle_budget = 2
+        results = []
+        def callback(arg):
+            results.append(arg)
+        for i in range(5):
+            self.event_loop.call_when_idle(callback, i)
+        handler = self.event_loop.call_when_idle(callback, 5)
+        handler.cancel()
+        self.event_loop.run_once()
+        self.assertLessEqual(len(results), 2)
+        self.event_loop.run()
+        self.assertEqual(results, [0, 1, 2, 3, 4])
+
+    def test_shutdown(self):
+        results = []
+        def callback(arg):
+            results.append(arg)
+        self.event_loop.call_soon(callback, 1)
+        self.event_loop.call_soon(self.event_loop.call_soon, callback, 2)
+        timer = self.event_loop.call_later(10, callback, 3)
+        abandoned = self.event_loop.shutdown(1)
+        self.assertEqual(results, [1, 2])
+        self.assertTrue(timer.cancelled)
+        self.assertEqual(abandoned, {'callbacks': 0, 'timers': 1,
+                                     'readers': 0, 'writers': 0})
+
+    def test_shutdown_drains_writers(self):
+        r, w = self.event_loop._socketpair()
+        self.addCleanup(r.close)
+        self.addCleanup(w.close)
+        errors = []
+        def writer():
+            w.send(b'x')
+            self.event_loop.remove_writer(w.fileno())
+            try:
+                self.event_loop.add_reader(r.fileno(), lambda: None)
+            except RuntimeError:
+                errors.append(True)
+        self.event_loop.add_writer(w.fileno(), writer)
+        abandoned = self.event_loop.shutdown(1)
+        self.assertEqual(r.recv(1), b'x')
+        self.assertEqual(errors, [True])
+        self.assertEqual(abandoned['writers'], 0)
+
+    def test_shutdown_timeout(self):
+        r, w = self.event_loop._socketpair()
+        self.addCleanup(r.close)
+        self.addCleanup(w.close)
+        self.event_loop.add_reader(r.fileno(), r.recv, 1)
+        def callback():
+            self.event_loop.call_soon(callback)
+        self.event_loop.call_soon(callback)
+        t0 = time.time()
+        abandoned = self.event_loop.shutdown(0.1)
+        self.assertLess(time.time() - t0, 1)
+        self.assertEqual(abandoned['callbacks'], 1)
+        self.assertEqual(abandoned['readers'], 1)
+
+    @unittest.skipUnless(hasattr(signal, 'SIGUSR1'), 'No SIGUSR1')
+    def test_signal_coalescing(self):
+        counts = []
+        def my_handler():
+            counts.append(
+                    self.event_loop.signal_delivery_count(signal.SIGUSR1))
+        self.event_loop.add_signal_handler(signal.SIGUSR1, my_handler)
+        try:
+            for i in range(5):
+                os.kill(os.getpid(), signal.SIGUSR1)
+            self.event_loop.run_once()
+            self.assertEqual(len(counts), 1)
+            if sys.version_info >= (3, 5):
+                self.assertEqual(counts, [5])
+        finally:
+            self.event_loop.remove_signal_handler(signal.SIGUSR1)
+
 
 if hasattr(looping, 'PyUVEventLoop'):
     class PyUVEventLoopTests(EventLoopTestsMixin,
@@ -331,20 +789,203 @@ if hasattr(looping, 'PyUVEventLoop'):
         def create_event_loop(self):
             return looping.PyUVEventLoop()
 
+        def test_backend_fd(self):
+            results = []
+            fd = self.event_loop.backend_fd()
+            self.event_loop.call_soon(results.append, 1)
+            self.assertEqual(self.event_loop.backend_timeout(), 0)
+            self.event_loop.step()
+            self.assertEqual(results, [1])
+            r, w = self.event_loop._socketpair()
+            self.addCleanup(r.close)
+            self.addCleanup(w.close)
+            def reader():
+                r.recv(1)
+                results.append(2)
+            self.event_loop.add_reader(r.fileno(), reader)
+            self.event_loop.call_later(10, results.append, 3)
+            # libuv registers new watchers with the backend when it runs.
+            self.event_loop.step()
+            timeout = self.event_loop.backend_timeout()
+            self.assertTrue(9 < timeout <= 10)
+            w.send(b'x')
+            readable, _, _ = select.select([fd], [], [], timeout)
+            self.assertEqual(readable, [fd])
+            self.event_loop.step()
+            self.assertEqual(results, [1, 2])
+
+        def test_backend_timeout_wakeups(self):
+            # Embed the loop like PyUVBridge does. A pending timer must not
+            # cause more than a few wakeups.
+            results = []
+            self.event_loop.call_later(0.1, results.append, 'timer')
+            fd = self.event_loop.backend_fd()
+            steps = 0
+            while steps < 100:
+                self.event_loop.step()
+                steps += 1
+                if results:
+                    break
+                timeout = self.event_loop.backend_timeout()
+                select.select([fd], [], [], timeout)
+            self.assertEqual(results, ['timer'])
+            self.assertLess(steps, 10)
+
+        def test_backend_timeout_idle(self):
+            # Nothing can wake up an idle loop, so it must not be polled.
+            self.event_loop.step()
+            self.assertIsNone(self.event_loop.backend_timeout())
+            handler = self.event_loop.call_later(10, lambda: None)
+            self.assertTrue(9 < self.event_loop.backend_timeout() <= 10)
+            handler.cancel()
+            self.event_loop.step()
+            self.assertIsNone(self.event_loop.backend_timeout())
+
+        def test_backend_timeout_pending_registration(self):
+            # A reader added after step() is only registered with the backend
+            # when the loop runs again, so it must be stepped right away.
+            results = []
+            self.event_loop.step()
+            r, w = self.event_loop._socketpair()
+            self.addCleanup(r.close)
+            self.addCleanup(w.close)
+            self.event_loop.add_reader(r.fileno(), results.append, 1)
+            w.send(b'x')
+            self.assertEqual(self.event_loop.backend_timeout(), 0)
+            self.event_loop.step()
+            self.assertEqual(results, [1])
+            self.event_loop.remove_reader(r.fileno())
+
+        @unittest.skipUnless(hasattr(signal, 'SIGUSR1'), 'No SIGUSR1')
+        def test_signal_multiple_loops(self):
+            import pyuv
+            other = looping.PyUVEventLoop(pyuv.Loop())
+            self.addCleanup(other.close)
+            caught = []
+            self.event_loop.add_signal_handler(signal.SIGUSR1, caught.append, 1)
+            other.add_signal_handler(signal.SIGUSR1, caught.append, 2)
+            try:
+                os.kill(os.getpid(), signal.SIGUSR1)
+                self.event_loop.run_once()
+                other.run_once()
+            finally:
+                self.event_loop.remove_signal_handler(signal.SIGUSR1)
+                other.remove_signal_handler(signal.SIGUSR1)
+            self.assertEqual(sorted(caught), [1, 2])
+
 if hasattr(looping, 'PySideEventLoop'):
     class PySideEventLoopTests(EventLoopTestsMixin,
                                test_utils.LogTrackingTestCase):
         def create_event_loop(self):
             return looping.PySideEventLoop()
 
-        def test_add_signal_handler(self):
-            pass
-
-        def test_cancel_signal_handler(self):
-            pass
-
-        def test_signal_handling_while_selecting(self):
-            pass
+if hasattr(looping, 'PyUVEventLoop') and hasattr(looping, 'PySideEventLoop'):
+    class PyUVBridgeTests(test_utils.LogTrackingTestCase):
+
+        def setUp(self):
+            super(PyUVBridgeTests, self).setUp()
+            self.event_loop = looping.PySideEventLoop()
+            self.uv_loop = looping.PyUVEventLoop()
+
+        def tearDown(self):
+            self.event_loop.close()
+            self.uv_loop.close()
+            super(PyUVBridgeTests, self).tearDown()
+
+        def test_bridge(self):
+            results = []
+            bridge = self.event_loop.attach_pyuv_loop(self.uv_loop)
+            self.assertIs(bridge.loop, self.uv_loop)
+            r, w = self.uv_loop._socketpair()
+            self.addCleanup(r.close)
+            self.addCleanup(w.close)
+            def reader():
+                results.append(r.recv(1))
+                self.uv_loop.remove_reader(r.fileno())
+                self.uv_loop.call_later(0.01, self.event_loop.stop)
+            self.uv_loop.add_reader(r.fileno(), reader)
+            self.event_loop.call_soon(w.send, b'x')
+            self.event_loop.run_forever()
+            self.assertEqual(results, [b'x'])
+            bridge.close()
+
+        def test_bridge_timer_wakeups(self):
+            # A pending pyuv timer must not make the bridge busy-poll.
+            steps = [0]
+            step = self.uv_loop.step
+            def counting_step():
+                steps[0] += 1
+                step()
+            self.uv_loop.step = counting_step
+            bridge = self.event_loop.attach_pyuv_loop(self.uv_loop)
+            results = []
+            self.uv_loop.call_later(0.1, results.append, 'timer')
+            self.event_loop.call_later(0.2, self.event_loop.stop)
+            self.event_loop.run_forever()
+            bridge.close()
+            self.assertEqual(results, ['timer'])
+            self.assertLess(steps[0], 10)
+
+        def test_bridge_idle(self):
+            # An idle pyuv loop must not arm the timer.
+            bridge = self.event_loop.attach_pyuv_loop(self.uv_loop)
+            self.uv_loop.step()
+            bridge._update_timer()
+            self.assertFalse(bridge._timer.isActive())
+            bridge.close()
+
+        def test_bridge_reader_after_step(self):
+            results = []
+            bridge = self.event_loop.attach_pyuv_loop(self.uv_loop)
+            self.uv_loop.step()
+            r, w = self.uv_loop._socketpair()
+            self.addCleanup(r.close)
+            self.addCleanup(w.close)
+            def reader():
+                results.append(r.recv(1))
+                self.uv_loop.remove_reader(r.fileno())
+            self.uv_loop.add_reader(r.fileno(), reader)
+            w.send(b'x')
+            self.event_loop.call_later(0.1, self.event_loop.stop)
+            self.event_loop.run_forever()
+            bridge.close()
+            self.assertEqual(results, [b'x'])
+
+
+@unittest.skipUnless(hasattr(signal, 'SIGUSR1'), 'No SIGUSR1')
+class SignalDispatcherTests(unittest.TestCase):
+
+    class Loop(object):
+        def __init__(self):
+            self.received = []
+        def _signal_received(self, signum, count):
+            self.received.append((signum, count))
+
+    def test_fan_out(self):
+        dispatcher = base._SignalDispatcher()
+        loops = [self.Loop(), self.Loop()]
+        for loop in loops:
+            dispatcher.add(loop, signal.SIGUSR1)
+        try:
+            os.kill(os.getpid(), signal.SIGUSR1)
+            dispatcher.drain()
+            dispatcher.remove(loops[0], signal.SIGUSR1)
+            self.assertIsNotNone(dispatcher.fileno())
+            self.assertNotEqual(signal.getsignal(signal.SIGUSR1),
+                                signal.SIG_DFL)
+        finally:
+            for loop in loops:
+                dispatcher.remove(loop, signal.SIGUSR1)
+        for loop in loops:
+            self.assertEqual(loop.received, [(signal.SIGUSR1, 1)])
+        self.assertIsNone(dispatcher.fileno())
+        self.assertEqual(signal.getsignal(signal.SIGUSR1), signal.SIG_DFL)
+
+    def test_add_error(self):
+        dispatcher = base._SignalDispatcher()
+        self.assertRaises(RuntimeError, dispatcher.add, self.Loop(),
+                          signal.SIGKILL)
+        self.assertIsNone(dispatcher.fileno())
 
 
 class HandlerTests(unittest.TestCase):
@@ -381,6 +1022,16 @@ class HandlerTests(unittest.TestCase):
                           events.make_handler, h1, (1,2,))
 
 
+    def test_handler_source(self):
+        self.assertIsNone(events.Handler(len, ()).source)
+        events.set_debug(True)
+        try:
+            h = events.make_handler(len, ())
+        finally:
+            events.set_debug(False)
+        self.assertIn('test_events.py', h.source)
+        self.assertIn('test_handler_source', h.source)
+
 class TimerTests(unittest.TestCase):
 
     def test_timer(self):
@@ -421,11 +1072,11 @@ class TimerTests(unittest.TestCase):
         self.assertFalse(h2 > h1)
         self.assertTrue(h1 >= h2)
         self.assertTrue(h2 >= h1)
-        self.assertTrue(h1 == h2)
-        self.assertFalse(h1 != h2)
-
-        h2.cancel()
+        # Equality is identity.
         self.assertFalse(h1 == h2)
+        self.assertTrue(h1 != h2)
+        self.assertTrue(h1 == h1)
+        self.assertEqual(len(set([h1, h2, h1])), 2)
 
         h1 = events.Timer(when, callback, ())
         h2 = events.Timer(when + 10.0, callback, ())
@@ -441,9 +1092,89 @@ class TimerTests(unittest.TestCase):
         self.assertTrue(h1 != h2)
 
         h3 = events.Handler(callback, ())
-        self.assertIs(NotImplemented, h1.__eq__(h3))
-        self.assertIs(NotImplemented, h1.__ne__(h3))
-
+        self.assertFalse(h1 == h3)
+        self.assertTrue(h1 != h3)
+
+
+    def test_timer_reset(self):
+        delays = []
+        h = events.make_timer(1.0, lambda: None, ())
+        self.assertIsInstance(h, events.Timer)
+        self.assertRaises(RuntimeError, h.reset)
+        h.reset_callback = delays.append
+        h.reset()
+        h.reset(2.0)
+        self.assertEqual(delays, [1.0, 2.0])
+        h.extend(10.0)
+        self.assertAlmostEqual(delays[-1], 12.0, places=1)
+        self.assertAlmostEqual(h.when, util.monotonic() + 12.0, places=1)
+        h.cancel()
+        self.assertRaises(RuntimeError, h.reset)
+        self.assertIs(events.make_timer(1.0, h, ()), h)
+
+    def test_make_timer_handler(self):
+        h = events.Handler(lambda: None, ())
+        self.assertIs(events.make_timer(1.0, h, ()), h)
+
+
+@unittest.skipUnless(hasattr(sys, 'getrefcount'), 'needs sys.getrefcount()')
+class HandlerPoolTests(unittest.TestCase):
+
+    def test_recycle(self):
+        pool = events.HandlerPool(2)
+        h = pool.handler(len, ('x',))
+        self.assertEqual(h.generation, 0)
+        self.assertTrue(pool.release(h))
+        self.assertEqual(len(pool), 1)
+        self.assertEqual(h.generation, 1)
+        self.assertIsNone(h.callback)
+        h2 = pool.handler(max, (1, 2))
+        self.assertIs(h2, h)
+        self.assertIs(h2.callback, max)
+        self.assertEqual(len(pool), 0)
+
+    def test_recycle_timer(self):
+        pool = events.HandlerPool(2)
+        t = pool.timer(10, len, ('x',))
+        self.assertIsInstance(t, events.Timer)
+        t.reset_callback = lambda delay: None
+        self.assertTrue(pool.release(t))
+        self.assertIsNone(t.reset_callback)
+        t2 = pool.timer(1, max, ())
+        self.assertIs(t2, t)
+        self.assertLessEqual(t2.when, util.monotonic() + 1)
+
+    def test_referenced_handler_not_recycled(self):
+        pool = events.HandlerPool(2)
+        held = []
+        def release():
+            h = pool.handler(len, ())
+            held.append(h)
+            return pool.release(h)
+        self.assertFalse(release())
+        self.assertEqual(held[0].generation, 0)
+        self.assertEqual(len(pool), 0)
+
+    def test_bounded(self):
+        pool = events.HandlerPool(1)
+        h1 = pool.handler(len, ())
+        h2 = pool.handler(len, ())
+        self.assertTrue(pool.release(h1))
+        self.assertFalse(pool.release(h2))
+        self.assertEqual(len(pool), 1)
+
+    def test_disabled(self):
+        pool = events.HandlerPool()
+        h = pool.handler(len, ())
+        self.assertFalse(pool.release(h))
+        self.assertIsNot(pool.handler(len, ()), h)
+
+    def test_unpooled_handler(self):
+        pool = events.HandlerPool(2)
+        h = events.make_handler(len, ())
+        self.assertIs(pool.handler(h, ()), h)
+        self.assertIs(pool.timer(1, h, ()), h)
+        self.assertFalse(pool.release(h))
 
 class AbstractEventLoopTests(unittest.TestCase):
 
@@ -545,6 +1276,24 @@ class PolicyTests(unittest.TestCase):
         self.assertIs(event_loop, policy.get_event_loop())
         self.assertIsNot(old_event_loop, policy.get_event_loop())
 
+    def test_backend_selection(self):
+        self.assertRaises(ValueError, events.DefaultEventLoopPolicy, 'foo')
+        self.assertRaises(ValueError, events.get_backend, 'foo')
+        policy = events.DefaultEventLoopPolicy(['pyside', 'pyuv'])
+        self.assertEqual(policy._backends, ('pyside', 'pyuv'))
+        policy = events.DefaultEventLoopPolicy('pyside')
+        self.assertEqual(policy._backends, ('pyside',))
+
+    @unittest.skipIf(sys.version_info < (3, 7), 'Requires PEP 562')
+    def test_lazy_backend_import(self):
+        code = ('import sys, looping; '
+                'print(any(m in sys.modules for m in '
+                '("looping.pyuv", "looping.pyside", "PySide")))')
+        env = dict(os.environ)
+        env['PYTHONPATH'] = os.path.dirname(os.path.dirname(looping.__file__))
+        output = subprocess.check_output([sys.executable, '-c', code], env=env)
+        self.assertEqual(output.strip(), b'False')
+
     def test_get_event_loop_policy(self):
         policy = events.get_event_loop_policy()
         self.assertIsInstance(policy, events.EventLoopPolicy)
@@ -0,0 +1,101 @@
+#
+# This file is part of looping. Looping is free software available under the
+# terms of the Apache 2.0 license. See the file "LICENSE" that was provided
+# together with this source file for the licensing terms.
+#
+# Copyright (c) 2012-2013 the authors. See the file "AUTHORS" for a complete
+# list.
+
+"""Tests for futures.py."""
+
+from __future__ import absolute_import, print_function
+
+import unittest
+
+from looping import futures
+
+
+class Loop(object):
+    """A loop that only records call_soon() calls."""
+
+    def __init__(self):
+        self.ready = []
+
+    def call_soon(self, callback, *args):
+        self.ready.append((callback, args))
+
+    def run(self):
+        ready, self.ready = self.ready, []
+        for callback, args in ready:
+            callback(*args)
+
+
+class FutureTests(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = Loop()
+
+    def test_initial_state(self):
+        f = futures.Future(self.loop)
+        self.assertFalse(f.done())
+        self.assertFalse(f.cancelled())
+        self.assertRaises(futures.InvalidStateError, f.result)
+        self.assertRaises(futures.InvalidStateError, f.exception)
+
+    def test_result(self):
+        f = futures.Future(self.loop)
+        f.set_result(42)
+        self.assertTrue(f.done())
+        self.assertEqual(f.result(), 42)
+        self.assertIsNone(f.exception())
+        self.assertRaises(futures.InvalidStateError, f.set_result, 43)
+        self.assertFalse(f.cancel())
+
+    def test_exception(self):
+        f = futures.Future(self.loop)
+        f.set_exception(ValueError)
+        self.assertIsInstance(f.exception(), ValueError)
+        self.assertRaises(ValueError, f.result)
+        self.assertRaises(futures.InvalidStateError,
+                          f.set_exception, ValueError())
+
+    def test_cancel(self):
+        f = futures.Future(self.loop)
+        self.assertTrue(f.cancel())
+        self.assertTrue(f.done())
+        self.assertTrue(f.cancelled())
+        self.assertRaises(futures.CancelledError, f.result)
+        self.assertRaises(futures.CancelledError, f.exception)
+        self.assertRaises(futures.InvalidStateError, f.set_result, 1)
+
+    def test_done_callbacks(self):
+        results = []
+        f = futures.Future(self.loop)
+        f.add_done_callback(results.append)
+        f.add_done_callback(results.append)
+        f.set_result(1)
+        self.assertEqual(results, [])
+        self.loop.run()
+        self.assertEqual(results, [f, f])
+        f.add_done_callback(results.append)
+        self.loop.run()
+        self.assertEqual(results, [f, f, f])
+
+    def test_remove_done_callback(self):
+        results = []
+        f = futures.Future(self.loop)
+        f.add_done_callback(results.append)
+        f.add_done_callback(results.append)
+        self.assertEqual(f.remove_done_callback(results.append), 2)
+        self.assertEqual(f.remove_done_callback(results.append), 0)
+        f.set_result(1)
+        self.loop.run()
+        self.assertEqual(results, [])
+
+    def test_slots(self):
+        f = futures.Future(self.loop)
+        self.assertRaises(AttributeError, setattr, f, 'foo', 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
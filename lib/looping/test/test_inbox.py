@@ -0,0 +1,85 @@
+#
+# This file is part of looping. Looping is free software available under the
+# terms of the Apache 2.0 license. See the file "LICENSE" that was provided
+# together with this source file for the licensing terms.
+#
+# Copyright (c) 2012-2013 the authors. See the file "AUTHORS" for a complete
+# list.
+
+"""Tests for inbox.py."""
+
+from __future__ import absolute_import, print_function
+
+import threading
+import time
+import unittest
+
+from looping import inbox
+
+
+class InboxTests(unittest.TestCase):
+
+    def test_put_swap(self):
+        box = inbox.Inbox()
+        self.assertTrue(box.put(1))
+        self.assertTrue(box.put_many([2, 3]))
+        self.assertEqual(len(box), 3)
+        self.assertEqual(box.swap(), [1, 2, 3])
+        self.assertEqual(len(box), 0)
+        self.assertEqual(box.swap(), [])
+
+    def test_wakeup(self):
+        wakeups = []
+        box = inbox.Inbox(wakeup=lambda: wakeups.append(1))
+        box.put(1)
+        box.put(2)
+        self.assertEqual(len(wakeups), 1)
+        box.swap()
+        box.put_many([3, 4])
+        self.assertEqual(len(wakeups), 2)
+
+    def test_invalid_arguments(self):
+        self.assertRaises(ValueError, inbox.Inbox, 0)
+        self.assertRaises(ValueError, inbox.Inbox, 1, 'spill')
+
+    def test_drop(self):
+        box = inbox.Inbox(2, 'drop')
+        self.assertTrue(box.put(1))
+        self.assertTrue(box.put(2))
+        self.assertFalse(box.put(3))
+        self.assertFalse(box.put_many([3, 4, 5]))
+        self.assertEqual(box.swap(), [1, 2])
+        self.assertTrue(box.put_many([3, 4]))
+
+    def test_capacity_is_per_producer(self):
+        box = inbox.Inbox(1, 'drop')
+        self.assertTrue(box.put(1))
+        result = []
+        t = threading.Thread(target=lambda: result.append(box.put(2)))
+        t.start()
+        t.join()
+        self.assertEqual(result, [True])
+        self.assertEqual(box.swap(), [1, 2])
+
+    def test_block(self):
+        box = inbox.Inbox(1, 'block')
+        box.put(1)
+        result = []
+        def producer():
+            box.put(2)
+            result.append(box.put(3))
+        t = threading.Thread(target=producer)
+        t.start()
+        time.sleep(0.05)
+        self.assertEqual(box.swap(), [1, 2])
+        t.join()
+        self.assertEqual(result, [True])
+        self.assertEqual(box.swap(), [3])
+
+    def test_block_timeout(self):
+        box = inbox.Inbox(1, 'block')
+        box.put(1)
+        t0 = time.time()
+        self.assertFalse(box.put(2, timeout=0.05))
+        self.assertTrue(time.time() - t0 >= 0.04)
+        self.assertEqual(box.swap(), [1])
@@ -0,0 +1,54 @@
+#
+# This file is part of looping. Looping is free software available under the
+# terms of the Apache 2.0 license. See the file "LICENSE" that was provided
+# together with this source file for the licensing terms.
+#
+# Copyright (c) 2012-2013 the authors. See the file "AUTHORS" for a complete
+# list.
+
+"""Tests for inotify.py."""
+
+from __future__ import absolute_import, print_function
+
+import os
+import select
+import sys
+import tempfile
+import unittest
+
+from looping import inotify
+
+
+@unittest.skipUnless(sys.platform.startswith('linux'), 'Linux only')
+class InotifyTests(unittest.TestCase):
+
+    def test_events(self):
+        dirname = tempfile.mkdtemp()
+        ino = inotify.Inotify()
+        try:
+            self.assertEqual(ino.read_events(), [])
+            wd = ino.add_watch(dirname, inotify.IN_CREATE | inotify.IN_DELETE)
+            path = os.path.join(dirname, 'foo')
+            open(path, 'w').close()
+            os.unlink(path)
+            select.select([ino.fileno()], [], [], 1)
+            events = ino.read_events()
+            self.assertEqual([(e[0], e[1], e[3]) for e in events],
+                             [(wd, inotify.IN_CREATE, 'foo'),
+                              (wd, inotify.IN_DELETE, 'foo')])
+            ino.rm_watch(wd)
+        finally:
+            ino.close()
+            os.rmdir(dirname)
+
+    def test_error(self):
+        ino = inotify.Inotify()
+        try:
+            self.assertRaises(OSError, ino.add_watch, '/nonexistent/path',
+                              inotify.IN_CREATE)
+        finally:
+            ino.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
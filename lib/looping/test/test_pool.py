@@ -0,0 +1,107 @@
+#
+# This file is part of looping. Looping is free software available under the
+# terms of the Apache 2.0 license. See the file "LICENSE" that was provided
+# together with this source file for the licensing terms.
+#
+# Copyright (c) 2012-2013 the authors. See the file "AUTHORS" for a complete
+# list.
+
+"""Tests for pool.py."""
+
+from __future__ import absolute_import, print_function
+
+import threading
+import unittest
+
+import looping
+from looping import pool
+from looping.test import test_utils
+
+
+class LoopPoolArgumentTests(unittest.TestCase):
+
+    def test_invalid_size(self):
+        self.assertRaises(ValueError, pool.LoopPool, 0)
+
+    def test_invalid_balance(self):
+        self.assertRaises(ValueError, pool.LoopPool, 2, balance='random')
+
+    def test_not_started(self):
+        p = pool.LoopPool(2)
+        self.assertRaises(RuntimeError, p.submit, lambda: None)
+
+
+@unittest.skipUnless(hasattr(looping, 'PyUVEventLoop'), 'pyuv required')
+class LoopPoolTests(test_utils.LogTrackingTestCase):
+
+    def run_callbacks(self, balance):
+        p = pool.LoopPool(4, balance=balance)
+        p.start()
+        try:
+            done = threading.Event()
+            threads = set()
+            lock = threading.Lock()
+            def callback():
+                with lock:
+                    threads.add(threading.current_thread().name)
+                    if len(threads) == 4:
+                        done.set()
+            for i in range(100):
+                p.submit(callback)
+            done.wait(5)
+            self.assertEqual(len(threads), 4)
+        finally:
+            p.stop()
+        return p
+
+    def test_round_robin(self):
+        self.run_callbacks('round-robin')
+
+    def test_least_loaded(self):
+        self.run_callbacks('least-loaded')
+
+    def test_separate_loops(self):
+        p = pool.LoopPool(2)
+        p.start()
+        try:
+            loops = p.loops
+            self.assertEqual(len(loops), 2)
+            self.assertIsNot(loops[0], loops[1])
+            self.assertIsNot(loops[0]._loop, loops[1]._loop)
+        finally:
+            p.stop()
+
+    def test_add_socket(self):
+        p = pool.LoopPool(2)
+        p.start()
+        done = threading.Event()
+        result = []
+        def callback(loop, sock):
+            result.append((loop, sock))
+            done.set()
+        r, w = p.loops[0]._socketpair()
+        try:
+            p.add_socket(r, callback)
+            done.wait(5)
+            self.assertEqual(result, [(p.loops[0], r)])
+            self.assertEqual(p.stats()['sockets'], 1)
+        finally:
+            p.stop()
+            r.close()
+            w.close()
+
+    def test_stats(self):
+        p = pool.LoopPool(1)
+        p.start()
+        try:
+            done = threading.Event()
+            p.submit(lambda: None)
+            p.submit(done.set)
+            done.wait(5)
+            stats = p.stats()
+            self.assertEqual(stats['loops'], 1)
+            self.assertEqual(stats['submitted'], 2)
+            self.assertTrue(stats['completed'] >= 1)
+            self.assertEqual(stats['per_loop'][0]['submitted'], 2)
+        finally:
+            p.stop()
@@ -0,0 +1,138 @@
+#
+# This file is part of looping. Looping is free software available under the
+# terms of the Apache 2.0 license. See the file "LICENSE" that was provided
+# together with this source file for the licensing terms.
+#
+# Copyright (c) 2012-2013 the authors. See the file "AUTHORS" for a complete
+# list.
+
+"""Tests for runner.py."""
+
+from __future__ import absolute_import, print_function
+
+import os
+import select
+import signal
+import socket
+import sys
+import time
+import unittest
+
+import looping
+from looping.test import test_utils
+
+if sys.platform != 'win32':
+    from looping import runner
+
+
+@unittest.skipUnless(hasattr(socket, 'SO_REUSEPORT'), 'No SO_REUSEPORT')
+class ReusePortSocketTests(unittest.TestCase):
+
+    def test_create_reuseport_socket(self):
+        s1 = runner.create_reuseport_socket('127.0.0.1', 0)
+        port = s1.getsockname()[1]
+        s2 = runner.create_reuseport_socket('127.0.0.1', port)
+        self.assertEqual(s2.getsockname()[1], port)
+        s1.close()
+        s2.close()
+
+
+def echo_pid(loop, sock):
+    def accept():
+        try:
+            client, addr = sock.accept()
+        except socket.error:
+            return
+        client.sendall(str(os.getpid()).encode('ascii'))
+        client.close()
+    loop.add_reader(sock.fileno(), accept)
+
+
+@unittest.skipUnless(hasattr(socket, 'SO_REUSEPORT'), 'No SO_REUSEPORT')
+@unittest.skipUnless(hasattr(looping, 'PyUVEventLoop'), 'pyuv required')
+class ReusePortServerTests(test_utils.LogTrackingTestCase):
+
+    def get_free_port(self):
+        sock = socket.socket()
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+        sock.close()
+        return port
+
+    def connect(self, port):
+        for i in range(50):
+            try:
+                return socket.create_connection(('127.0.0.1', port))
+            except socket.error:
+                time.sleep(0.1)
+        self.fail('could not connect to server')
+
+    def test_server(self):
+        port = self.get_free_port()
+        pid = os.fork()
+        if pid == 0:
+            try:
+                server = runner.ReusePortServer(echo_pid, '127.0.0.1', port,
+                                                workers=2)
+                server.run()
+            finally:
+                os._exit(0)
+        try:
+            pids = set()
+            for i in range(20):
+                conn = self.connect(port)
+                pids.add(conn.recv(100))
+                conn.close()
+            self.assertTrue(len(pids) >= 1)
+            self.assertNotIn(str(pid).encode('ascii'), pids)
+        finally:
+            os.kill(pid, signal.SIGTERM)
+            _, status = os.waitpid(pid, 0)
+        self.assertEqual(status, 0)
+
+    def test_worker_restart(self):
+        port = self.get_free_port()
+        rfd, wfd = os.pipe()
+
+        def worker(loop, sock):
+            os.write(wfd, '{}\n'.format(os.getpid()).encode('ascii'))
+            echo_pid(loop, sock)
+
+        pid = os.fork()
+        if pid == 0:
+            try:
+                os.close(rfd)
+                server = runner.ReusePortServer(worker, '127.0.0.1', port,
+                                                workers=2)
+                server.run()
+            finally:
+                os._exit(0)
+        os.close(wfd)
+        buf = [b'']
+
+        def read_pid():
+            while b'\n' not in buf[0]:
+                ready, _, _ = select.select([rfd], [], [], 10)
+                self.assertTrue(ready, 'no worker started')
+                buf[0] += os.read(rfd, 100)
+            line, buf[0] = buf[0].split(b'\n', 1)
+            return int(line)
+
+        try:
+            workers = [read_pid(), read_pid()]
+            # A worker that is stopped must be restarted, and must not take
+            # down the parent with it.
+            os.kill(workers[0], signal.SIGTERM)
+            restarted = read_pid()
+            self.assertNotIn(restarted, workers)
+            self.assertRaises(OSError, os.kill, workers[0], 0)
+            os.kill(workers[1], 0)
+            self.assertEqual(os.waitpid(pid, os.WNOHANG), (0, 0))
+            conn = self.connect(port)
+            self.assertIn(int(conn.recv(100)), workers[1:] + [restarted])
+            conn.close()
+        finally:
+            os.close(rfd)
+            os.kill(pid, signal.SIGTERM)
+            _, status = os.waitpid(pid, 0)
+        self.assertEqual(status, 0)
@@ -0,0 +1,372 @@
+#
+# This file is part of looping. Looping is free software available under the
+# terms of the Apache 2.0 license. See the file "LICENSE" that was provided
+# together with this source file for the licensing terms.
+#
+# Copyright (c) 2012-2013 the authors. See the file "AUTHORS" for a complete
+# list.
+
+"""Tests for transports.py."""
+
+from __future__ import absolute_import, print_function
+
+import gc
+import os
+import socket
+import sys
+import tempfile
+import unittest
+
+import looping
+from looping import events, protocols, transports
+from looping.test import test_utils
+
+
+class RecordingProtocol(protocols.Protocol):
+
+    def __init__(self):
+        self.events = []
+        self.data = []
+
+    def connection_made(self, transport):
+        self.events.append('connection_made')
+
+    def connection_lost(self, exc):
+        self.events.append(('connection_lost', exc))
+
+    def pause_writing(self):
+        self.events.append('pause_writing')
+
+    def resume_writing(self):
+        self.events.append('resume_writing')
+
+    def data_received(self, data):
+        self.data.append(bytes(data))
+
+    def eof_received(self):
+        self.events.append('eof_received')
+
+
+def recv_all(sock):
+    chunks = []
+    while True:
+        data = sock.recv(65536)
+        if not data:
+            break
+        chunks.append(data)
+    return b''.join(chunks)
+
+
+class TransportTestsMixin(object):
+
+    def setUp(self):
+        super(TransportTestsMixin, self).setUp()
+        self.event_loop = self.create_event_loop()
+        events.set_event_loop(self.event_loop)
+
+    def tearDown(self):
+        self.event_loop.close()
+        gc.collect()
+        super(TransportTestsMixin, self).tearDown()
+
+    def test_write(self):
+        r, w = self.event_loop._socketpair()
+        proto = RecordingProtocol()
+        tr = transports.WriteTransport(self.event_loop, w, proto)
+        tr.write(b'foo')
+        tr.write(bytearray(b'bar'))
+        tr.writelines([b'baz', memoryview(b'qux')])
+        self.assertEqual(tr.get_write_buffer_size(), 12)
+        tr.close()
+        self.event_loop.run()
+        self.assertEqual(recv_all(r), b'foobarbazqux')
+        self.assertEqual(proto.events,
+                         ['connection_made', ('connection_lost', None)])
+        self.assertRaises(RuntimeError, tr.write, b'x')
+        r.close()
+
+    def test_flow_control(self):
+        r, w = self.event_loop._socketpair()
+        r.setblocking(False)
+        proto = RecordingProtocol()
+        tr = transports.WriteTransport(self.event_loop, w, proto,
+                                       high_water=4096, low_water=1024)
+        received = []
+        def reader():
+            try:
+                received.append(r.recv(65536))
+            except socket.error:
+                pass
+        self.event_loop.add_reader(r.fileno(), reader)
+        data = b'x' * 1024
+        for i in range(1024):
+            tr.write(data)
+        self.assertEqual(proto.events, ['pause_writing'])
+        def check():
+            if tr.get_write_buffer_size() == 0:
+                self.event_loop.remove_reader(r.fileno())
+                tr.close()
+            else:
+                self.event_loop.call_later(0.01, check)
+        self.event_loop.call_later(0.01, check)
+        self.event_loop.run()
+        self.assertEqual(proto.events, ['pause_writing', 'connection_made',
+                                        'resume_writing',
+                                        ('connection_lost', None)])
+        r.setblocking(True)
+        self.assertEqual(len(b''.join(received) + recv_all(r)), 1024 * 1024)
+        r.close()
+
+    def test_write_interest_only_while_pending(self):
+        r, w = self.event_loop._socketpair()
+        tr = transports.WriteTransport(self.event_loop, w)
+        self.assertFalse(self.event_loop.remove_writer(w.fileno()))
+        tr.write(b'foo')
+        self.event_loop.run()
+        self.assertFalse(self.event_loop.remove_writer(w.fileno()))
+        self.assertEqual(r.recv(10), b'foo')
+        tr.close()
+        self.event_loop.run()
+        r.close()
+
+    def test_abort(self):
+        r, w = self.event_loop._socketpair()
+        proto = RecordingProtocol()
+        tr = transports.WriteTransport(self.event_loop, w, proto)
+        tr.write(b'foo')
+        tr.abort()
+        self.event_loop.run()
+        self.assertEqual(recv_all(r), b'')
+        self.assertEqual(proto.events[-1], ('connection_lost', None))
+        r.close()
+
+    def test_write_eof(self):
+        r, w = self.event_loop._socketpair()
+        tr = transports.WriteTransport(self.event_loop, w)
+        tr.write(b'foo')
+        tr.write_eof()
+        self.assertRaises(RuntimeError, tr.write, b'bar')
+        self.event_loop.run()
+        self.assertEqual(recv_all(r), b'foo')
+        tr.close()
+        self.event_loop.run()
+        r.close()
+
+    def test_read(self):
+        r, w = self.event_loop._socketpair()
+        proto = RecordingProtocol()
+        pool = transports.BufferPool(1024)
+        tr = transports.ReadTransport(self.event_loop, r, proto, pool=pool)
+        self.event_loop.call_later(0.01, w.send, b'foo')
+        self.event_loop.call_later(0.05, w.send, b'bar')
+        self.event_loop.call_later(0.1, w.close)
+        self.event_loop.run()
+        self.assertEqual(b''.join(proto.data), b'foobar')
+        self.assertEqual(proto.events, ['connection_made', 'eof_received',
+                                        ('connection_lost', None)])
+        self.assertEqual(pool.allocated, 1)
+        self.assertEqual(len(pool), 1)
+
+    def test_read_views_are_released(self):
+        r, w = self.event_loop._socketpair()
+        views = []
+        class Proto(protocols.Protocol):
+            def data_received(self, data):
+                views.append(data)
+        tr = transports.ReadTransport(self.event_loop, r, Proto())
+        w.send(b'foo')
+        w.close()
+        self.event_loop.run()
+        self.assertEqual(len(views), 1)
+        if hasattr(views[0], 'release'):
+            self.assertRaises(ValueError, views[0].tobytes)
+
+    def test_read_kept_slice(self):
+        r, w = self.event_loop._socketpair()
+        kept = []
+        class Proto(protocols.Protocol):
+            def data_received(self, data):
+                kept.append(data[:3])
+        pool = transports.BufferPool(1024)
+        tr = transports.ReadTransport(self.event_loop, r, Proto(), pool=pool)
+        self.event_loop.call_later(0.01, w.send, b'foo')
+        self.event_loop.call_later(0.05, w.send, b'bar')
+        self.event_loop.call_later(0.1, w.close)
+        self.event_loop.run()
+        self.assertEqual([bytes(view) for view in kept], [b'foo', b'bar'])
+        self.assertEqual(pool.allocated, 3)
+
+    def test_pause_reading(self):
+        r, w = self.event_loop._socketpair()
+        proto = RecordingProtocol()
+        tr = transports.ReadTransport(self.event_loop, r, proto)
+        tr.pause_reading()
+        w.send(b'foo')
+        self.event_loop.call_later(0.05, tr.resume_reading)
+        self.event_loop.call_later(0.1, w.close)
+        self.event_loop.run_once(0.02)
+        self.assertEqual(proto.data, [])
+        self.event_loop.run()
+        self.assertEqual(proto.data, [b'foo'])
+
+    def test_socket_transport(self):
+        r, w = self.event_loop._socketpair()
+        class Echo(RecordingProtocol):
+            def connection_made(self, transport):
+                self.transport = transport
+            def data_received(self, data):
+                self.transport.write(bytes(data))
+        tr = transports.SocketTransport(self.event_loop, r, Echo(),
+                                        buffer_size=16, high_water=1024)
+        w.send(b'hello')
+        w.shutdown(socket.SHUT_WR)
+        self.event_loop.run()
+        self.assertEqual(recv_all(w), b'hello')
+        w.close()
+
+    @unittest.skipUnless(hasattr(socket, 'AF_UNIX'), 'No AF_UNIX')
+    def test_unix_connection(self):
+        path = os.path.join(tempfile.mkdtemp(), 'sock')
+        class Echo(protocols.Protocol):
+            def connection_made(self, transport):
+                self.transport = transport
+            def data_received(self, data):
+                self.transport.write(bytes(data))
+        server = self.event_loop.start_serving_unix(Echo, path)
+        proto = RecordingProtocol()
+        tr, p = self.event_loop.create_unix_connection(lambda: proto, path)
+        self.assertIs(p, proto)
+        tr.write(b'hello')
+        def check():
+            if proto.data:
+                tr.close()
+                server.close()
+            else:
+                self.event_loop.call_later(0.01, check)
+        self.event_loop.call_later(0.01, check)
+        self.event_loop.run()
+        self.assertEqual(b''.join(proto.data), b'hello')
+        self.assertFalse(os.path.exists(path))
+        os.rmdir(os.path.dirname(path))
+
+    @unittest.skipUnless(sys.platform.startswith('linux'), 'Linux only')
+    def test_unix_connection_abstract(self):
+        path = '\0looping-test-{}'.format(os.getpid())
+        server = self.event_loop.start_serving_unix(RecordingProtocol, path)
+        proto = RecordingProtocol()
+        tr, p = self.event_loop.create_unix_connection(lambda: proto, path)
+        def close():
+            tr.close()
+            server.close()
+        self.event_loop.call_later(0.01, close)
+        self.event_loop.run()
+        self.assertEqual(proto.events,
+                         ['connection_made', ('connection_lost', None)])
+        self.assertEqual(server.sockets, [])
+
+    @unittest.skipUnless(hasattr(socket, 'AF_UNIX'), 'No AF_UNIX')
+    @unittest.skipUnless(hasattr(socket.socket, 'sendmsg'), 'No sendmsg')
+    def test_fd_passing(self):
+        r, w = socket.socketpair(socket.AF_UNIX, socket.SOCK_STREAM)
+        received = []
+        class Proto(RecordingProtocol):
+            def fds_received(self, fds):
+                received.extend(fds)
+        proto = Proto()
+        reader = transports.UnixSocketTransport(self.event_loop, r, proto)
+        writer = transports.UnixSocketTransport(self.event_loop, w)
+        pr, pw = os.pipe()
+        writer.write(b'foo')
+        writer.send_fds(b'bar', [pr])
+        writer.close()
+        self.event_loop.run()
+        os.close(pr)
+        self.assertEqual(b''.join(proto.data), b'foobar')
+        self.assertEqual(len(received), 1)
+        os.write(pw, b'x')
+        self.assertEqual(os.read(received[0], 1), b'x')
+        os.close(received[0])
+        os.close(pw)
+
+    def test_datagram_endpoint(self):
+        class Proto(protocols.DatagramProtocol):
+            def __init__(self):
+                self.batches = []
+            def datagrams_received(self, datagrams):
+                self.batches.append(datagrams)
+        tr1, proto1 = self.event_loop.create_datagram_endpoint(
+                Proto, local_addr=('127.0.0.1', 0))
+        addr = tr1.get_extra_info('sockname')
+        if addr is None:
+            addr = tr1.get_extra_info('socket').getsockname()
+        tr2, proto2 = self.event_loop.create_datagram_endpoint(
+                Proto, remote_addr=addr)
+        def send():
+            for i in range(10):
+                tr2.sendto(str(i).encode('ascii'))
+        self.event_loop.call_soon(send)
+        def check():
+            if sum(len(batch) for batch in proto1.batches) == 10:
+                tr1.close()
+                tr2.close()
+            else:
+                self.event_loop.call_later(0.01, check)
+        self.event_loop.call_later(0.01, check)
+        self.event_loop.run()
+        datagrams = [data for batch in proto1.batches for data, _ in batch]
+        self.assertEqual(datagrams, [str(i).encode('ascii') for i in range(10)])
+        self.assertTrue(len(proto1.batches) < 10)
+
+    def test_datagram_protocol(self):
+        received = []
+        class Proto(protocols.DatagramProtocol):
+            def datagram_received(self, data, addr):
+                received.append((data, addr))
+        Proto().datagrams_received([(b'a', 1), (b'b', 2)])
+        self.assertEqual(received, [(b'a', 1), (b'b', 2)])
+
+
+if hasattr(looping, 'PyUVEventLoop'):
+    class PyUVTransportTests(TransportTestsMixin,
+                             test_utils.LogTrackingTestCase):
+        def create_event_loop(self):
+            return looping.PyUVEventLoop()
+
+if hasattr(looping, 'PySideEventLoop'):
+    class PySideTransportTests(TransportTestsMixin,
+                               test_utils.LogTrackingTestCase):
+        def create_event_loop(self):
+            return looping.PySideEventLoop()
+
+
+class BufferPoolTests(unittest.TestCase):
+
+    def test_pool(self):
+        pool = transports.BufferPool(16, maxsize=2)
+        bufs = [pool.acquire() for i in range(3)]
+        self.assertEqual([len(buf) for buf in bufs], [16, 16, 16])
+        self.assertEqual(pool.allocated, 3)
+        for buf in bufs:
+            pool.release(buf)
+        self.assertEqual(len(pool), 2)
+        self.assertIs(pool.acquire(), bufs[1])
+        self.assertEqual(pool.allocated, 3)
+
+    def test_invalid_buffer_size(self):
+        self.assertRaises(ValueError, transports.BufferPool, 0)
+
+
+class WriteBufferLimitsTests(unittest.TestCase):
+
+    def test_invalid_limits(self):
+        r, w = socket.socketpair()
+        try:
+            self.assertRaises(ValueError, transports.WriteTransport, None, w,
+                              high_water=10, low_water=20)
+        finally:
+            r.close()
+            w.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
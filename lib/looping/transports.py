@@ -0,0 +1,557 @@
+#
+# This file is part of looping. Looping is free software available under the
+# terms of the Apache 2.0 license. See the file "LICENSE" that was provided
+# together with this source file for the licensing terms.
+#
+# Copyright (c) 2012-2013 the authors. See the file "AUTHORS" for a complete
+# list.
+
+"""Socket transports.
+
+The transports are implemented on top of the ready-based callback methods
+of the event loop (``add_reader()`` and ``add_writer()``), and therefore work
+with any of the loops in this package.
+"""
+
+from __future__ import absolute_import, print_function
+
+__all__ = ['BufferPool', 'ReadTransport', 'WriteTransport', 'SocketTransport',
+           'UnixSocketTransport', 'DatagramTransport']
+
+import array
+import collections
+import itertools
+import logging
+import os
+import socket
+
+from . import util
+
+# Maximum number of buffers that is passed to a single sendmsg() call.
+try:
+    MAX_IOV = os.sysconf('SC_IOV_MAX')
+except (AttributeError, ValueError, OSError):
+    MAX_IOV = 16
+if MAX_IOV <= 0:
+    MAX_IOV = 16
+
+
+class _BaseTransport(object):
+    """Base class for socket transports.
+
+    The transports below cooperate through super(), so that they can be
+    combined with multiple inheritance, like in :class:`SocketTransport`.
+    """
+
+    def __init__(self, loop, sock, protocol=None, extra=None):
+        self._loop = loop
+        self._sock = sock
+        self._fd = sock.fileno()
+        self._protocol = protocol
+        self._extra = dict(extra or ())
+        self._extra.setdefault('socket', sock)
+        self._closing = False
+        self._closed = False
+        sock.setblocking(False)
+        if protocol is not None:
+            loop.call_soon(protocol.connection_made, self)
+
+    @property
+    def closing(self):
+        return self._closing
+
+    def get_extra_info(self, name, default=None):
+        """Get optional transport information."""
+        return self._extra.get(name, default)
+
+    def close(self):
+        """Close the transport.
+
+        Buffered data is flushed asynchronously. After it has been flushed,
+        the protocol's connection_lost() method is called with None.
+        """
+        if self._closing:
+            return
+        self._closing = True
+        self._maybe_close()
+
+    def abort(self):
+        """Close the transport immediately, discarding buffered data."""
+        self._force_close(None)
+
+    def _maybe_close(self):
+        self._force_close(None)
+
+    def _stop_io(self):
+        pass
+
+    def _force_close(self, exc):
+        if self._closed:
+            return
+        self._closing = True
+        self._closed = True
+        self._stop_io()
+        self._loop.call_soon(self._call_connection_lost, exc)
+
+    def _fatal_error(self, exc):
+        logging.debug('Fatal error on transport %r: %s', self, exc)
+        self._force_close(exc)
+
+    def _call_connection_lost(self, exc):
+        try:
+            if self._protocol is not None:
+                self._protocol.connection_lost(exc)
+        finally:
+            self._sock.close()
+            self._sock = None
+            self._protocol = None
+            self._loop = None
+
+
+class WriteTransport(_BaseTransport):
+    """A buffered write transport for a stream socket.
+
+    Writes are queued as a list of buffers. When the socket becomes writable,
+    as many buffers as possible are sent with a single ``sendmsg()`` call
+    (scatter/gather I/O). The transport only registers interest in
+    writability while it has data pending.
+
+    When the amount of buffered data goes over *high_water* bytes, the
+    protocol's pause_writing() method is called. When it drains to
+    *low_water* bytes or less, resume_writing() is called.
+    """
+
+    def __init__(self, loop, sock, protocol=None, extra=None,
+                 high_water=64*1024, low_water=None, **kwargs):
+        super(WriteTransport, self).__init__(loop, sock, protocol, extra,
+                                             **kwargs)
+        self._buffers = collections.deque()
+        self._buffer_size = 0
+        self._writing = False
+        self._write_paused = False
+        self._eof = False
+        self.set_write_buffer_limits(high_water, low_water)
+
+    def set_write_buffer_limits(self, high=None, low=None):
+        """Set the high and low water marks for write flow control."""
+        if high is None:
+            high = 64*1024 if low is None else 4*low
+        if low is None:
+            low = high // 4
+        if not 0 <= low <= high:
+            raise ValueError('invalid water marks: high={}, low={}'
+                             .format(high, low))
+        self._high_water = high
+        self._low_water = low
+        self._maybe_pause_writing()
+
+    def get_write_buffer_size(self):
+        """Return the number of bytes in the write buffer."""
+        return self._buffer_size
+
+    def write(self, data):
+        """Queue *data* to be written to the socket."""
+        if self._eof:
+            raise RuntimeError('cannot write after write_eof()')
+        if self._closing:
+            raise RuntimeError('transport is closing')
+        if not data:
+            return
+        if isinstance(data, bytearray):
+            data = bytes(data)
+        self._buffers.append(data)
+        self._buffer_size += len(data)
+        if not self._writing:
+            self._loop.add_writer(self._fd, self._write_ready)
+            self._writing = True
+        self._maybe_pause_writing()
+
+    def writelines(self, list_of_data):
+        """Queue a list of buffers to be written to the socket."""
+        for data in list_of_data:
+            self.write(data)
+
+    def can_write_eof(self):
+        return True
+
+    def write_eof(self):
+        """Close the write end of the socket after all data is flushed."""
+        if self._eof:
+            return
+        self._eof = True
+        if not self._writing:
+            self._sock.shutdown(socket.SHUT_WR)
+
+    def _maybe_pause_writing(self):
+        if self._write_paused or self._buffer_size <= self._high_water:
+            return
+        self._write_paused = True
+        if self._protocol is not None:
+            try:
+                self._protocol.pause_writing()
+            except Exception:
+                logging.exception('pause_writing() failed')
+
+    def _maybe_resume_writing(self):
+        if not self._write_paused or self._buffer_size > self._low_water:
+            return
+        self._write_paused = False
+        if self._protocol is not None:
+            try:
+                self._protocol.resume_writing()
+            except Exception:
+                logging.exception('resume_writing() failed')
+
+    def _next_batch(self):
+        return list(itertools.islice(self._buffers, 0, MAX_IOV))
+
+    def _send(self, buffers):
+        if hasattr(self._sock, 'sendmsg'):
+            return self._sock.sendmsg(buffers)
+        return self._sock.send(b''.join(bytes(buf) for buf in buffers))
+
+    def _write_ready(self):
+        if self._closed:
+            return
+        buffers = self._next_batch()
+        try:
+            nbytes = self._send(buffers)
+        except socket.error as e:
+            if e.errno in util.TRYAGAIN:
+                return
+            self._fatal_error(e)
+            return
+        self._consume(nbytes)
+        if not self._buffers:
+            self._loop.remove_writer(self._fd)
+            self._writing = False
+            if self._eof:
+                self._sock.shutdown(socket.SHUT_WR)
+        self._maybe_resume_writing()
+        if not self._buffers and self._closing:
+            self._maybe_close()
+
+    def _consume(self, nbytes):
+        self._buffer_size -= nbytes
+        buffers = self._buffers
+        while nbytes:
+            size = len(buffers[0])
+            if nbytes < size:
+                buffers[0] = memoryview(buffers[0])[nbytes:]
+                break
+            buffers.popleft()
+            nbytes -= size
+
+    def _maybe_close(self):
+        if not self._buffers:
+            super(WriteTransport, self)._maybe_close()
+
+    def _stop_io(self):
+        super(WriteTransport, self)._stop_io()
+        if self._writing:
+            self._loop.remove_writer(self._fd)
+            self._writing = False
+        self._buffers.clear()
+        self._buffer_size = 0
+
+
+class BufferPool(object):
+    """A pool of preallocated, reusable receive buffers.
+
+    The pool hands out ``bytearray`` objects of *buffer_size* bytes. At most
+    *maxsize* released buffers are kept for reuse. A pool can be shared by
+    many transports.
+    """
+
+    def __init__(self, buffer_size=64*1024, maxsize=16):
+        if buffer_size < 1:
+            raise ValueError('invalid buffer size: {}'.format(buffer_size))
+        self._buffer_size = buffer_size
+        self._maxsize = maxsize
+        self._free = []
+        self.allocated = 0
+
+    @property
+    def buffer_size(self):
+        return self._buffer_size
+
+    def __len__(self):
+        return len(self._free)
+
+    def acquire(self):
+        """Return a buffer from the pool, allocating one if it is empty."""
+        if self._free:
+            return self._free.pop()
+        self.allocated += 1
+        return bytearray(self._buffer_size)
+
+    def release(self, buf):
+        """Return a buffer to the pool."""
+        if len(self._free) < self._maxsize and len(buf) == self._buffer_size:
+            self._free.append(buf)
+
+
+class ReadTransport(_BaseTransport):
+    """A read transport for a stream socket.
+
+    Data is read with ``recv_into()`` into a buffer from a
+    :class:`BufferPool`, and handed to the protocol's data_received() as a
+    ``memoryview`` of the received bytes. The buffer is reused as soon as
+    data_received() returns, and the memoryview is then released, so a
+    protocol must copy any data that it needs to keep. A buffer that is
+    still referenced by a view, e.g. a slice of the data, is not reused.
+
+    If *pool* is not specified, a private pool with buffers of *buffer_size*
+    bytes is used.
+    """
+
+    def __init__(self, loop, sock, protocol=None, extra=None, pool=None,
+                 buffer_size=64*1024, **kwargs):
+        super(ReadTransport, self).__init__(loop, sock, protocol, extra,
+                                            **kwargs)
+        if pool is None:
+            pool = BufferPool(buffer_size, 1)
+        self._pool = pool
+        self._read_paused = False
+        self._reading = False
+        self._loop.add_reader(self._fd, self._read_ready)
+        self._reading = True
+
+    def close(self):
+        if not self._closing and self._reading:
+            self._loop.remove_reader(self._fd)
+            self._reading = False
+        super(ReadTransport, self).close()
+
+    def pause_reading(self):
+        """Stop reading until resume_reading() is called."""
+        if self._closing or self._read_paused:
+            return
+        self._read_paused = True
+        self._loop.remove_reader(self._fd)
+        self._reading = False
+
+    def resume_reading(self):
+        """Resume reading after pause_reading()."""
+        if self._closing or not self._read_paused:
+            return
+        self._read_paused = False
+        self._loop.add_reader(self._fd, self._read_ready)
+        self._reading = True
+
+    def _read_ready(self):
+        if self._closed:
+            return
+        buf = self._pool.acquire()
+        try:
+            try:
+                nbytes = self._recv_into(buf)
+            except socket.error as e:
+                if e.errno in util.TRYAGAIN:
+                    return
+                self._fatal_error(e)
+                return
+            if nbytes == 0:
+                self._eof_received()
+                return
+            view = memoryview(buf)
+            data = view[:nbytes]
+            try:
+                self._protocol.data_received(data)
+            finally:
+                util.release_memoryview(data)
+                util.release_memoryview(view)
+                # If the protocol kept a view of the buffer, e.g. a slice of
+                # the data, the buffer cannot be reused.
+                if util.has_exports(buf):
+                    buf = None
+        finally:
+            if buf is not None:
+                self._pool.release(buf)
+
+    def _recv_into(self, buf):
+        return self._sock.recv_into(buf)
+
+    def _eof_received(self):
+        self._loop.remove_reader(self._fd)
+        self._reading = False
+        keep_open = False
+        if hasattr(self._protocol, 'eof_received'):
+            keep_open = self._protocol.eof_received()
+        if not keep_open:
+            self.close()
+
+    def _stop_io(self):
+        super(ReadTransport, self)._stop_io()
+        if self._reading:
+            self._loop.remove_reader(self._fd)
+            self._reading = False
+
+
+class SocketTransport(ReadTransport, WriteTransport):
+    """A bidirectional stream socket transport.
+
+    This combines :class:`ReadTransport` and :class:`WriteTransport`, and
+    accepts the keyword arguments of both.
+    """
+
+
+class _FdBuffer(bytes):
+    """A write buffer that carries file descriptors as ancillary data."""
+
+
+class UnixSocketTransport(SocketTransport):
+    """A transport for AF_UNIX stream sockets that can pass file descriptors.
+
+    File descriptors are sent with send_fds() and are passed to the
+    protocol's fds_received() method, before the data that they were sent
+    with is passed to data_received(). Received file descriptors are owned by
+    the protocol, which must close them. At most *max_fds* file descriptors
+    are received per read.
+    """
+
+    def __init__(self, loop, sock, protocol=None, extra=None, max_fds=16,
+                 **kwargs):
+        super(UnixSocketTransport, self).__init__(loop, sock, protocol, extra,
+                                                  **kwargs)
+        self._ancbufsize = socket.CMSG_LEN(max_fds * array.array('i').itemsize)
+
+    def send_fds(self, data, fds):
+        """Queue *data* to be written, together with the file descriptors
+        in the sequence *fds*. The data must not be empty."""
+        if not data:
+            raise ValueError('file descriptors must be sent with data')
+        buf = _FdBuffer(data)
+        buf.fds = array.array('i', fds)
+        self.write(buf)
+
+    def _next_batch(self):
+        # A buffer with file descriptors is sent on its own, so that the
+        # descriptors arrive with the first byte of that buffer.
+        buffers = []
+        for buf in itertools.islice(self._buffers, 0, MAX_IOV):
+            if isinstance(buf, _FdBuffer):
+                if not buffers:
+                    buffers.append(buf)
+                break
+            buffers.append(buf)
+        return buffers
+
+    def _send(self, buffers):
+        if isinstance(buffers[0], _FdBuffer):
+            ancdata = [(socket.SOL_SOCKET, socket.SCM_RIGHTS, buffers[0].fds)]
+            return self._sock.sendmsg(buffers, ancdata)
+        return self._sock.sendmsg(buffers)
+
+    def _recv_into(self, buf):
+        nbytes, ancdata, flags, addr = \
+                self._sock.recvmsg_into([buf], self._ancbufsize)
+        fds = array.array('i')
+        for level, type, data in ancdata:
+            if level == socket.SOL_SOCKET and type == socket.SCM_RIGHTS:
+                data = data[:len(data) - (len(data) % fds.itemsize)]
+                fds.frombytes(data)
+        if fds:
+            if hasattr(self._protocol, 'fds_received'):
+                self._protocol.fds_received(list(fds))
+            else:
+                for fd in fds:
+                    os.close(fd)
+        return nbytes
+
+
+class DatagramTransport(_BaseTransport):
+    """A transport for datagram sockets.
+
+    On every readiness event, up to *batch_size* datagrams are read from the
+    socket. They are delivered to the protocol with a single call to its
+    datagrams_received() method, which amortizes the per-datagram overhead.
+
+    If *address* is specified, it is the default destination for sendto().
+    """
+
+    max_size = 64*1024
+
+    def __init__(self, loop, sock, protocol=None, extra=None, address=None,
+                 batch_size=64, **kwargs):
+        super(DatagramTransport, self).__init__(loop, sock, protocol, extra,
+                                                **kwargs)
+        self._address = address
+        self._batch_size = batch_size
+        self._send_queue = collections.deque()
+        self._writing = False
+        self._loop.add_reader(self._fd, self._read_ready)
+
+    def sendto(self, data, addr=None):
+        """Send a datagram to *addr*, or to the default address."""
+        if self._closing:
+            raise RuntimeError('transport is closing')
+        if addr is None:
+            addr = self._address
+        if not self._send_queue:
+            try:
+                self._sendto(data, addr)
+                return
+            except socket.error as e:
+                if e.errno not in util.TRYAGAIN:
+                    self._protocol.error_received(e)
+                    return
+        self._send_queue.append((bytes(data), addr))
+        if not self._writing:
+            self._loop.add_writer(self._fd, self._write_ready)
+            self._writing = True
+
+    def _sendto(self, data, addr):
+        if addr is None:
+            self._sock.send(data)
+        else:
+            self._sock.sendto(data, addr)
+
+    def _read_ready(self):
+        if self._closed:
+            return
+        sock = self._sock
+        datagrams = []
+        for i in range(self._batch_size):
+            try:
+                datagrams.append(sock.recvfrom(self.max_size))
+            except socket.error as e:
+                if e.errno not in util.TRYAGAIN:
+                    self._protocol.error_received(e)
+                break
+        if datagrams:
+            self._protocol.datagrams_received(datagrams)
+
+    def _write_ready(self):
+        if self._closed:
+            return
+        while self._send_queue:
+            data, addr = self._send_queue[0]
+            try:
+                self._sendto(data, addr)
+            except socket.error as e:
+                if e.errno in util.TRYAGAIN:
+                    return
+                self._protocol.error_received(e)
+            self._send_queue.popleft()
+        self._loop.remove_writer(self._fd)
+        self._writing = False
+        if self._closing:
+            self._maybe_close()
+
+    def close(self):
+        if not self._closing:
+            self._loop.remove_reader(self._fd)
+        super(DatagramTransport, self).close()
+
+    def _maybe_close(self):
+        if not self._send_queue:
+            super(DatagramTransport, self)._maybe_close()
+
+    def _stop_io(self):
+        super(DatagramTransport, self)._stop_io()
+        self._loop.remove_reader(self._fd)
+        if self._writing:
+            self._loop.remove_writer(self._fd)
+            self._writing = False
+        self._send_queue.clear()
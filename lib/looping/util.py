@@ -9,6 +9,7 @@
 import os
 import sys
 import errno
+import time
 import warnings
 
 try:
@@ -16,6 +17,17 @@ try:
 except ImportError:
     fcntl = None
 
+try:
+    from _thread import get_ident
+except ImportError:
+    from thread import get_ident
+
+try:
+    from time import monotonic
+except ImportError:
+    # Python < 3.3. Not monotonic, but the best we have.
+    monotonic = time.time
+
 # Errno values indicating the socket isn't ready for I/O just yet.
 TRYAGAIN = frozenset((errno.EAGAIN, errno.EWOULDBLOCK, errno.EINPROGRESS))
 if sys.platform == 'win32':
@@ -31,3 +43,31 @@ def setblocking(fd, blocking):
     else:
         flags &= ~os.O_NONBLOCK
     fcntl.fcntl(fd, fcntl.F_SETFL, flags)
+
+
+def release_memoryview(view):
+    """Release a memoryview, if supported (Python 3.2+).
+
+    Return False if the view could not be released because it is still
+    exported, True otherwise.
+    """
+    if hasattr(view, 'release'):
+        try:
+            view.release()
+        except BufferError:
+            return False
+    return True
+
+
+def has_exports(buf):
+    """Return True if *buf*, a bytearray, has exported buffers.
+
+    A bytearray cannot be resized while e.g. a memoryview of it is alive, so
+    this shrinks and regrows it by one byte. The last byte is clobbered.
+    """
+    try:
+        del buf[-1]
+    except BufferError:
+        return True
+    buf.append(0)
+    return False